@@ -147,11 +147,23 @@ class ExportUSDZ(bpy.types.Operator, ExportHelper):
         max=1000.0,
         default=1.0,
     )
+    compressionLevel: IntProperty(
+        name="Compression Level",
+        description="LZ4 Compression Level of the Binary Crate File, 0 uses fast compression (1 and 2 are the same as 0) and 3 to 12 use high compression that searches for longer matches",
+        min=0,
+        max=12,
+        default=0,
+    )
     useConverter: BoolProperty(
         name="Use Usdz Converter Tool",
         description="Use Apple's Converter Tool to create the Usdz file",
         default=False,
     )
+    printStats: BoolProperty(
+        name="Print Stats",
+        description="Print Crate File Statistics to the Console",
+        default=False,
+    )
 
     def execute(self, context):
         from . import export_usdz
@@ -191,6 +203,7 @@ class USDZ_PT_export_include(bpy.types.Panel):
         col.prop(operator, 'exportMaterials')
         col.prop(operator, 'exportAnimations')
         layout.prop(operator, 'globalScale')
+        layout.prop(operator, 'compressionLevel')
 
 
 class USDZ_PT_export_textures(bpy.types.Panel):
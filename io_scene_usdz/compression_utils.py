@@ -1,58 +1,118 @@
 
+import sys
+import struct
+from array import array
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import lz4.block as lz4block
+except ImportError:
+    lz4block = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 MAX_BLOCK_INPUT_SIZE = 0x7E000000
 
 MAX_OFFSET = 65535
 MIN_MATCH = 4
 MFLIMIT = 12
+LAST_LITERALS = 5
+
+LZ4_MAX_CHUNKS = 127
+LZ4_CHUNK_SIZE = MAX_BLOCK_INPUT_SIZE
+# Streams are compressed a chunk at a time, so keep the chunks small
+LZ4_STREAM_CHUNK_SIZE = 1 << 20
+
+LZ4HC_MIN_LEVEL = 3
+LZ4HC_MAX_LEVEL = 12
+
+NUMPY_MIN_INTS = 64
+
+# Buffers compressed with NumPy match finding, searched in segments of
+# LZ4_NUMPY_SEGMENT positions to bound the temporary arrays
+LZ4_NUMPY_MIN_SIZE = 1024
+LZ4_NUMPY_SEGMENT = 1 << 17
+LZ4_NUMPY_ROUNDS = 2
+
+INT_TYPE_CODES = {1: 'B', 2: 'H', 4: 'I', 8: 'Q'}
+
+LZ4_HASH_LOG = 16
+LZ4_SKIP_TRIGGER = 6
+
+# Buffers whose sampled compression ratio is at or above LZ4_SKIP_RATIO are
+# stored as literals, set it to None to always compress
+LZ4_SKIP_RATIO = 0.95
+LZ4_SKIP_MIN_SIZE = 65536
+LZ4_SAMPLE_SIZE = 4096
+LZ4_NUM_SAMPLES = 4
+
+unpackLeUint32 = struct.Struct('<I').unpack_from
 
 
 def decodeStrings(data, count, encoding='utf-8'):
-    strings = []
-    while count > 0:
-        p = data.find(0)
-        if p < 0:
-            break
-        strings.append(data[:p].decode(encoding))
-        data = data[p+1:]
-        count -= 1
-    return strings
+    # Strings are NUL terminated, any unterminated tail is dropped
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    strings = data.split(b'\x00', count)
+    return [str.decode(encoding) for str in strings[:-1]]
 
 def encodeStrings(strings, encoding='utf-8'):
-    data = bytearray()
-    for str in strings:
-        data += str.encode(encoding) + b'\x00'
-    return data
+    return bytearray(b''.join(str.encode(encoding) + b'\x00' for str in strings))
 
 
-def decodeInts(data, count, size, byteorder='little', signed=False):
-    ints = []
-    for i in range(count):
-        if i * size > len(data):
-            print('Over Run Data')
-            break
-        value = int.from_bytes(data[i*size:i*size + size], byteorder, signed=signed)
-        ints.append(value)
-    return ints
+def getIntTypeCode(size, signed=False):
+    # Array type code for an int size, or None if there is none
+    code = INT_TYPE_CODES.get(size)
+    if code == None or array(code).itemsize != size:
+        return None
+    return code.lower() if signed else code
+
+def decodeInts(data, count, size, byteorder='little', signed=False, view=False):
+    # With view set, a read only memoryview over the data is returned in place of a list
+    if count * size > len(data):
+        print('Over Run Data')
+        count = len(data) // size
+    code = getIntTypeCode(size, signed)
+    if code == None:
+        return [int.from_bytes(data[i*size:i*size + size], byteorder, signed=signed) for i in range(count)]
+    data = memoryview(data).cast('B')[:count * size]
+    if byteorder == sys.byteorder:
+        ints = data.cast(code)
+    else:
+        ints = array(code)
+        ints.frombytes(data)
+        ints.byteswap()
+    if not view:
+        return ints.tolist()
+    # Views can share the caller's buffer, keep them from writing to it
+    return memoryview(ints).toreadonly()
 
 def encodeInts(ints, size, byteorder='little', signed=False):
-    data = bytearray()
-    for i in ints:
-        data += i.to_bytes(size, byteorder, signed=signed)
-    return data
+    code = getIntTypeCode(size, signed)
+    if code == None:
+        return bytearray(b''.join(i.to_bytes(size, byteorder, signed=signed) for i in ints))
+    if byteorder != sys.byteorder or not isinstance(ints, array) or ints.typecode != code:
+        ints = array(code, ints)
+    if byteorder != sys.byteorder:
+        ints.byteswap()
+    return ints.tobytes()
 
+def iterEncodedInts(ints, size, batchSize=65536, byteorder='little', signed=False):
+    for i in range(0, len(ints), batchSize):
+        yield encodeInts(ints[i:i + batchSize], size, byteorder, signed)
 
-class PositionTable:
-    TABLE_SIZE = 4096
 
-    def __init__(self):
-        self.table = [None] * self.TABLE_SIZE
+class PositionTable:
+    def __init__(self, hashLog = LZ4_HASH_LOG):
+        self.shift = 32 - hashLog
+        self.table = array('I', [0]) * (1 << hashLog)
 
-    @staticmethod
-    def _hash(val):
-        val = val & 0x0FFFFFFFF  # prune to 32 bit
-        return (val * 2654435761) & 0x0FFF  # max = 4095
+    def _hash(self, val):
+        return ((val * 2654435761) & 0x0FFFFFFFF) >> self.shift
 
     def getPosition(self, val):
         index = self._hash(val)
@@ -63,6 +123,56 @@ class PositionTable:
         self.table[index] = pos
 
 
+class HashChainTable:
+    HASH_LOG = 15
+
+    def __init__(self, level):
+        level = min(level, LZ4HC_MAX_LEVEL)
+        self.maxAttempts = 1 << (level - 1)
+        self.head = [-1] * (1 << self.HASH_LOG)
+        # Distance back to the previous position with the same hash
+        self.chain = [0] * (MAX_OFFSET + 1)
+        self.nextToUpdate = 0
+
+    @classmethod
+    def _hash(cls, val):
+        return ((val * 2654435761) & 0x0FFFFFFFF) >> (32 - cls.HASH_LOG)
+
+    def insert(self, src, target):
+        pos = self.nextToUpdate
+        while pos < target:
+            index = self._hash(unpackLeUint32(src, pos)[0])
+            prev = self.head[index]
+            delta = pos - prev
+            self.chain[pos & MAX_OFFSET] = delta if prev >= 0 and delta <= MAX_OFFSET else 0
+            self.head[index] = pos
+            pos += 1
+        self.nextToUpdate = pos
+
+    def findLongestMatch(self, src, srcPtr, max):
+        self.insert(src, srcPtr)
+        val = unpackLeUint32(src, srcPtr)[0]
+        pos = self.head[self._hash(val)]
+        bestLen = 0
+        bestPos = -1
+        attempts = self.maxAttempts
+        while pos >= 0 and srcPtr - pos <= MAX_OFFSET and attempts > 0:
+            attempts -= 1
+            # Only count candidates that could beat the best match
+            if src[pos + bestLen] == src[srcPtr + bestLen] and unpackLeUint32(src, pos)[0] == val:
+                length = countMatch(src, pos, srcPtr, max)
+                if length > bestLen:
+                    bestLen = length
+                    bestPos = pos
+                    if srcPtr + bestLen > max:
+                        break
+            delta = self.chain[pos & MAX_OFFSET]
+            if delta == 0:
+                break
+            pos -= delta
+        return bestLen, bestPos
+
+
 def worstCaseBlockLength(srcLen):
     return srcLen + (srcLen // 255) + 16
 
@@ -79,27 +189,21 @@ def writeLeUint32(buf, i, val):
     buf[i + 2] = (val >> 16) & 0x000000FF
     buf[i + 3] = (val >> 24) & 0x000000FF
 
-def findMatch(table, val, src, srcPtr):
-    pos = table.getPosition(val)
-    if pos is not None and val == readLeUint32(src, pos):
-        # Check if the match is too far away
-        if srcPtr - pos > MAX_OFFSET:
-            return None
-        else:
-            return pos
-    else:
-        return None
-
-
 def countMatch(buf, front, back, max):
+    # Compare 8 byte words, doubling the stride while the slices match,
+    # then narrow down to the first byte that differs
+    limit = max + 1 - back
     count = 0
-    while back <= max:
-        if buf[front] == buf[back]:
-            count += 1
-        else:
-            break
-        front += 1
-        back += 1
+    step = 8
+    while count + step <= limit and \
+          buf[front + count:front + count + step] == buf[back + count:back + count + step]:
+        count += step
+        step <<= 1
+    while step > 1:
+        step >>= 1
+        if count + step <= limit and \
+           buf[front + count:front + count + step] == buf[back + count:back + count + step]:
+            count += step
     return count
 
 
@@ -148,131 +252,539 @@ def copySequence(dst, dstHead, literal, match):
     return dstPtr - dstHead
 
 
-def lz4CompressDefault(src):
+def writeLz4Length(dst, length):
+    while length >= 255:
+        dst.append(255)
+        length -= 255
+    dst.append(length)
+
+
+def writeSequence(dst, src, literalHead, literalEnd, offset, matchLen):
+    # Appending version of copySequence for a growing output buffer
+    litLen = literalEnd - literalHead
+    matchLen -= MIN_MATCH
+    token = (15 if litLen >= 15 else litLen) << 4
+    if matchLen >= 15:
+        token |= 15
+    elif matchLen > 0:
+        token |= matchLen
+    dst.append(token)
+    if litLen >= 15:
+        writeLz4Length(dst, litLen - 15)
+    dst += src[literalHead:literalEnd]
+    if offset > 0:
+        dst.append(offset & 0x00FF)
+        dst.append(offset >> 8)
+        if matchLen >= 15:
+            writeLz4Length(dst, matchLen - 15)
+
+
+def getRangeIndices(starts, counts):
+    # Concatenated ranges of counts indices from each start
+    ends = np.cumsum(counts)
+    return np.repeat(starts - ends + counts, counts) + np.arange(int(ends[-1]) if len(ends) else 0)
+
+def getLeUint32s(data, positions):
+    return data[positions].astype(np.uint32) | (data[positions + 1].astype(np.uint32) << 8) | \
+           (data[positions + 2].astype(np.uint32) << 16) | (data[positions + 3].astype(np.uint32) << 24)
+
+def findLz4MatchRuns(data, start, stop):
+    # Matches for positions start to stop against the most recent earlier
+    # position with the same 4 bytes, as start positions, offsets and lengths
+    lo = max(start - MAX_OFFSET, 0)
+    window = data[lo:stop + 3].astype(np.uint32)
+    values = window[:-3] | (window[1:-2] << 8) | (window[2:-1] << 16) | (window[3:] << 24)
+    # Sorted value and position keys group equal values in position order
+    keys = np.sort((values.astype(np.uint64) << 32) | np.arange(len(values), dtype=np.uint64))
+    order = (keys & 0xFFFFFFFF).astype(np.int32)
+    keys >>= 32
+    same = np.flatnonzero(keys[1:] == keys[:-1])
+    prev = np.full(len(values), -1 - MAX_OFFSET, dtype=np.int32)
+    prev[order[same + 1]] = order[same]
+    offsets = (np.arange(len(values), dtype=np.int32) - prev)[start - lo:]
+    positions = np.flatnonzero(offsets <= MAX_OFFSET)
+    offsets = offsets[positions]
+    positions += start
+    # Consecutive positions with the same offset are one match
+    runStart = np.ones(len(positions), dtype=bool)
+    runStart[1:] = (positions[1:] != positions[:-1] + 1) | (offsets[1:] != offsets[:-1])
+    runs = np.flatnonzero(runStart)
+    lengths = np.diff(np.append(runs, len(positions))) + MIN_MATCH - 1
+    positions = positions[runs]
+    offsets = offsets[runs]
+    # Extend each match past the end of its run, a word then a byte at a time
+    limits = len(data) - LAST_LITERALS - positions
+    active = np.flatnonzero(lengths + 4 <= limits)
+    for i in range(8):
+        ends = positions[active] + lengths[active]
+        active = active[getLeUint32s(data, ends) == getLeUint32s(data, ends - offsets[active])]
+        lengths[active] += 4
+        active = active[lengths[active] + 4 <= limits[active]]
+    active = np.arange(len(positions))
+    for i in range(3):
+        active = active[lengths[active] < limits[active]]
+        ends = positions[active] + lengths[active]
+        active = active[data[ends] == data[ends - offsets[active]]]
+        lengths[active] += 1
+    return positions, offsets, lengths
+
+def selectLz4Matches(positions, lengths, literalHead, maxIndex):
+    # Greedy choice of matches in position order, a match starts after the
+    # end of every chosen match before it and must keep MIN_MATCH bytes
+    ends = positions + lengths
+    def getStarts(chosen):
+        covered = np.where(chosen, ends, literalHead)
+        covered = np.maximum.accumulate(np.concatenate(([literalHead], covered[:-1])))
+        return np.maximum(positions, covered)
+    chosen = np.ones(len(positions), dtype=bool)
+    for i in range(LZ4_NUMPY_ROUNDS):
+        chosen = ends - getStarts(chosen) >= MIN_MATCH
+    # Dropping matches only moves the later starts back, so this is final
+    starts = getStarts(chosen)
+    chosen &= (ends - starts >= MIN_MATCH) & (starts < maxIndex)
+    return chosen, starts
+
+def writeLz4Sequences(dst, data, literalStarts, starts, offsets, lengths):
+    # Vectorized writeSequence for a batch of sequences with matches
+    litLens = starts - literalStarts
+    matchLens = lengths - MIN_MATCH
+    litExtra = np.where(litLens >= 15, (litLens - 15) // 255 + 1, 0)
+    matchExtra = np.where(matchLens >= 15, (matchLens - 15) // 255 + 1, 0)
+    sizes = litExtra + litLens + matchExtra + 3
+    heads = np.cumsum(sizes) - sizes
+    out = np.empty(int(sizes.sum()), dtype=np.uint8)
+    out[heads] = (np.minimum(litLens, 15) << 4) | np.minimum(matchLens, 15)
+    offsetPtrs = heads + 1 + litExtra + litLens
+    for extra, length, ptrs in ((litExtra, litLens, heads + 1), (matchExtra, matchLens, offsetPtrs + 2)):
+        long = np.flatnonzero(extra)
+        if len(long) > 0:
+            out[getRangeIndices(ptrs[long], extra[long])] = 255
+            out[ptrs[long] + extra[long] - 1] = (length[long] - 15) % 255
+    hasLiteral = np.flatnonzero(litLens)
+    out[getRangeIndices(heads[hasLiteral] + 1 + litExtra[hasLiteral], litLens[hasLiteral])] = \
+        data[getRangeIndices(literalStarts[hasLiteral], litLens[hasLiteral])]
+    out[offsetPtrs] = offsets & 0x00FF
+    out[offsetPtrs + 1] = offsets >> 8
+    dst += memoryview(out)
+
+def lz4CompressNumpy(src):
+    srcLen = len(src)
+    data = np.frombuffer(src, dtype=np.uint8)
+    dst = bytearray()
+    literalHead = 0
+    MAX_INDEX = srcLen - MFLIMIT
+    for start in range(0, max(MAX_INDEX, 0), LZ4_NUMPY_SEGMENT):
+        positions, offsets, lengths = findLz4MatchRuns(data, start, min(start + LZ4_NUMPY_SEGMENT, MAX_INDEX))
+        chosen, starts = selectLz4Matches(positions, lengths, literalHead, MAX_INDEX)
+        if not chosen.any():
+            continue
+        ends = (positions + lengths)[chosen]
+        starts = starts[chosen]
+        literalStarts = np.concatenate(([literalHead], ends[:-1]))
+        writeLz4Sequences(dst, data, literalStarts, starts, offsets[chosen], ends - starts)
+        literalHead = int(ends[-1])
+    # Write the last literal
+    writeSequence(dst, src, literalHead, srcLen, 0, 0)
+    return dst
+
+
+def lz4CompressDefault(src, acceleration = 1, hashLog = LZ4_HASH_LOG):
+    srcLen = len(src)
+    if srcLen > MAX_BLOCK_INPUT_SIZE:
+        return b''
+    # The NumPy match finder has no hash table to size or skip through,
+    # so tuned settings go through the table search below
+    if np != None and srcLen >= LZ4_NUMPY_MIN_SIZE and acceleration == 1 and hashLog == LZ4_HASH_LOG:
+        return lz4CompressNumpy(src)
+    if type(src) is not bytes:
+        src = bytes(src)
+    dst = bytearray()
+    posTable = PositionTable(hashLog)
+    table = posTable.table
+    shift = posTable.shift
+    srcPtr = 0
+    literalHead = 0
+    MAX_INDEX = srcLen - MFLIMIT
+    MATCH_LIMIT = srcLen - LAST_LITERALS - 1
+    # Step further ahead the longer no match has been found
+    searchCount = acceleration << LZ4_SKIP_TRIGGER
+
+    while srcPtr < MAX_INDEX:
+        curValue = unpackLeUint32(src, srcPtr)[0]
+        index = ((curValue * 2654435761) & 0x0FFFFFFFF) >> shift
+        matchPos = table[index]
+        table[index] = srcPtr
+        if srcPtr - matchPos > MAX_OFFSET or matchPos >= srcPtr or \
+           unpackLeUint32(src, matchPos)[0] != curValue:
+            srcPtr += searchCount >> LZ4_SKIP_TRIGGER
+            searchCount += 1
+            continue
+        length = MIN_MATCH
+        if src[matchPos + MIN_MATCH] == src[srcPtr + MIN_MATCH]:
+            length += countMatch(src, matchPos + MIN_MATCH,
+                                 srcPtr + MIN_MATCH, MATCH_LIMIT)
+        # Extend the match back over any skipped literals
+        while srcPtr > literalHead and matchPos > 0 and \
+              src[srcPtr - 1] == src[matchPos - 1]:
+            srcPtr -= 1
+            matchPos -= 1
+            length += 1
+        writeSequence(dst, src, literalHead, srcPtr, srcPtr - matchPos, length)
+        srcPtr += length
+        literalHead = srcPtr
+        searchCount = acceleration << LZ4_SKIP_TRIGGER
+        if srcPtr < MAX_INDEX:
+            # Fill the table with a position inside the match
+            pos = srcPtr - 2
+            table[((unpackLeUint32(src, pos)[0] * 2654435761) & 0x0FFFFFFFF) >> shift] = pos
+    # Write the last literal
+    writeSequence(dst, src, literalHead, srcLen, 0, 0)
+    return dst
+
+
+def lz4CompressHC(src, level = LZ4HC_MIN_LEVEL):
     srcLen = len(src)
     if srcLen > MAX_BLOCK_INPUT_SIZE:
         return b''
+    if type(src) is not bytes:
+        src = bytes(src)
     dst = bytearray(worstCaseBlockLength(srcLen))
-    posTable = PositionTable()
+    table = HashChainTable(level)
     srcPtr = 0
     literalHead = 0
     dstPtr = 0
     MAX_INDEX = srcLen - MFLIMIT
+    MATCH_LIMIT = srcLen - LAST_LITERALS - 1
 
     while srcPtr < MAX_INDEX:
-        curValue = readLeUint32(src, srcPtr)
-        matchPos = findMatch(posTable, curValue, src, srcPtr)
-        if matchPos is not None:
-            length = countMatch(src, matchPos, srcPtr, MAX_INDEX)
-            if length < MIN_MATCH:
+        length, matchPos = table.findLongestMatch(src, srcPtr, MATCH_LIMIT)
+        if length < MIN_MATCH:
+            srcPtr += 1
+            continue
+        # Lazy matching, emit a literal if the next byte starts a longer match
+        while srcPtr + 1 < MAX_INDEX:
+            nextLength, nextPos = table.findLongestMatch(src, srcPtr + 1, MATCH_LIMIT)
+            if nextLength <= length:
                 break
-            dstPtr += copySequence(dst, dstPtr,
-                                   memoryview(src)[literalHead:srcPtr],
-                                   (srcPtr - matchPos, length))
-            srcPtr += length
-            literalHead = srcPtr
-        else:
-            posTable.setPosition(curValue, srcPtr)
             srcPtr += 1
+            length = nextLength
+            matchPos = nextPos
+        dstPtr += copySequence(dst, dstPtr,
+                               memoryview(src)[literalHead:srcPtr],
+                               (srcPtr - matchPos, length))
+        srcPtr += length
+        literalHead = srcPtr
     # Write the last literal
     dstPtr += copySequence(dst, dstPtr,
                            memoryview(src)[literalHead:srcLen],
                            (0, 0))
     return dst[:dstPtr]
 
-def lz4Compress(src):
+
+def lz4CompressBlock(src, level = 0, acceleration = 1):
+    if level >= LZ4HC_MIN_LEVEL:
+        return lz4CompressHC(src, level)
+    return lz4CompressDefault(src, acceleration)
+
+def lz4LiteralBlock(src):
+    # A single literal run is a valid block that costs nothing to build
+    length = len(src)
     dst = bytearray()
-    inputSize = len(src)
-    if inputSize == 0:
-        return dst
-    if inputSize > 127 * MAX_BLOCK_INPUT_SIZE:
-        print('Buffer Too Large for LZ4 Compression')
-    elif inputSize <= MAX_BLOCK_INPUT_SIZE:
-        dst.append(0)
-        dst += lz4CompressDefault(src)
-    else:
-        wholeChunks = inputSize // MAX_BLOCK_INPUT_SIZE
-        partChunkSize = inputSize % MAX_BLOCK_INPUT_SIZE
-        partChunk = 1 if partChunkSize > 0 else 0
-        dst = (wholeChunks+partChunk).to_bytes(1, byteorder='little')
-        for i in range(wholeChunks):
-            offset = i * MAX_BLOCK_INPUT_SIZE
-            chunk = src[offset:offset+MAX_BLOCK_INPUT_SIZE]
-            chunk = lz4CompressDefault(chunk)
-            dst += (len(chunk)).to_bytes(4, byteorder='little')
-            dst += chunk
-        if partChunk == 1:
-            offset = wholeChunks * MAX_BLOCK_INPUT_SIZE
-            chunk = src[offset:]
-            chunk = lz4CompressDefault(chunk)
-            dst += (len(chunk)).to_bytes(4, byteorder='little')
-            dst += chunk
+    dst.append((15 if length >= 15 else length) << 4)
+    if length >= 15:
+        writeLz4Length(dst, length - 15)
+    dst += src
     return dst
 
+def sampleCompressionRatio(src, compressBlock, sampleSize = LZ4_SAMPLE_SIZE,
+                           numSamples = LZ4_NUM_SAMPLES):
+    # Estimate the compression ratio from a few evenly spaced windows
+    step = max(len(src) - sampleSize, 0) // max(numSamples - 1, 1)
+    inputSize = 0
+    outputSize = 0
+    for i in range(numSamples):
+        window = src[i * step:i * step + sampleSize]
+        inputSize += len(window)
+        outputSize += len(compressBlock(window))
+    return outputSize / max(inputSize, 1)
+
+def readLz4Length(src, srcPtr, length):
+    if length == 15:
+        while src[srcPtr] == 255:
+            length += 255
+            srcPtr += 1
+        length += src[srcPtr]
+        srcPtr += 1
+    return length, srcPtr
 
-def lz4DecompressChunk(src):
-    dst = bytearray()
+
+def lz4DecompressChunk(src, size = 0):
+    # Output is written with slice assignments, which grow the buffer as
+    # needed when size is smaller than the decompressed data
+    src = memoryview(src)
+    dst = bytearray(size)
+    dstPtr = 0
     srcLen = len(src)
     srcPtr = 0
     while srcPtr < srcLen:
-        token = memoryview(src)[srcPtr:srcPtr +  1]
+        token = src[srcPtr]
         srcPtr += 1
-        # Get Literal Length
-        litLen = (token[0] >> 4) & 0x0F
-        if litLen == 15:
-            while src[srcPtr] == 255:
-                litLen += 255
-                srcPtr += 1
-            litLen += src[srcPtr]
-            srcPtr += 1
         # Copy Literal
-        dst += src[srcPtr:srcPtr + litLen]
+        litLen, srcPtr = readLz4Length(src, srcPtr, token >> 4)
+        dst[dstPtr:dstPtr + litLen] = src[srcPtr:srcPtr + litLen]
+        dstPtr += litLen
         srcPtr += litLen
         # Reached Last Literal
         if srcPtr >= srcLen:
             break
-        # Get match offset
-        offset = int.from_bytes(src[srcPtr:srcPtr + 2], 'little')
+        # Get match offset and length
+        offset = src[srcPtr] | (src[srcPtr + 1] << 8)
         srcPtr += 2
-        # Get match length
-        matchLen = token[0] & 0x0F
-        if matchLen == 15:
-            while src[srcPtr] == 255:
-                matchLen += 255
-                srcPtr += 1
-            matchLen += src[srcPtr]
-            srcPtr += 1
+        if offset == 0 or offset > dstPtr:
+            raise ValueError('Invalid LZ4 match offset %d at output position %d' % (offset, dstPtr))
+        matchLen, srcPtr = readLz4Length(src, srcPtr, token & 0x0F)
         matchLen += MIN_MATCH
         # Copy Match
-        for i in range(matchLen):
-            dst.append(dst[len(dst) - offset])
+        matchPtr = dstPtr - offset
+        if offset >= matchLen:
+            dst[dstPtr:dstPtr + matchLen] = dst[matchPtr:matchPtr + matchLen]
+            dstPtr += matchLen
+        else:
+            # Overlapping match, the copied run doubles with each pass
+            matchEnd = dstPtr + matchLen
+            while dstPtr < matchEnd:
+                length = min(dstPtr - matchPtr, matchEnd - dstPtr)
+                dst[dstPtr:dstPtr + length] = dst[matchPtr:matchPtr + length]
+                dstPtr += length
+    if dstPtr < len(dst):
+        del dst[dstPtr:]
     return dst
 
 
-def lz4Decompress(src):
-    dst = bytearray()
-    if len(src) > 0:
-        if src[0] == 0:
-            dst = lz4DecompressChunk(memoryview(src)[1:])
+class Lz4Codec:
+    """Pure Python LZ4 Codec"""
+    name = 'python'
+    needsOutputSize = False
+
+    def compressBlock(self, src, level = 0, acceleration = 1):
+        return lz4CompressBlock(src, level, acceleration)
+
+    def decompressBlock(self, src, size = 0):
+        return lz4DecompressChunk(src, size)
+
+    def isCompressible(self, src, skipRatio = LZ4_SKIP_RATIO):
+        if skipRatio == None or len(src) < LZ4_SKIP_MIN_SIZE:
+            return True
+        return sampleCompressionRatio(src, self.compressBlock) < skipRatio
+
+    def compress(self, src, level = 0, acceleration = 1,
+                 chunkSize = LZ4_CHUNK_SIZE, workers = 1,
+                 skipRatio = LZ4_SKIP_RATIO, stats = None):
+        dst = bytearray()
+        inputSize = len(src)
+        if inputSize == 0:
+            return dst
+        if inputSize > LZ4_MAX_CHUNKS * MAX_BLOCK_INPUT_SIZE:
+            print('Buffer Too Large for LZ4 Compression')
+        elif inputSize <= chunkSize:
+            chunk, skipped = compressChunk((self.name, src, level, acceleration, skipRatio))
+            addLz4Stats(stats, inputSize, skipped)
+            dst.append(0)
+            dst += chunk
         else:
-            chunkSize = int.from_bytes(src[:4], 'little') - 1
-            #print('chunkSize', chunkSize)
-            srcPtr = 9
-            while chunkSize > 0:
-                dst += lz4DecompressChunk(memoryview(src)[srcPtr:srcPtr+chunkSize])
-                srcPtr += chunkSize
-                if srcPtr + 8 < len(src):
-                    srcPtr += 1
-                    chunkSize = int.from_bytes(src[srcPtr:srcPtr + 4], 'little')
-                    #print('chunkSize', chunkSize)
-                    srcPtr += 8
-                else:
-                    chunkSize = 0
-    return dst
+            # The chunk count is stored in a single signed byte
+            chunkSize = max(chunkSize, -(-inputSize // LZ4_MAX_CHUNKS))
+            src = memoryview(src)
+            jobs = [(self.name, src[i:i + chunkSize], level, acceleration, skipRatio)
+                    for i in range(0, inputSize, chunkSize)]
+            dst.append(len(jobs))
+            results = mapLz4Jobs(compressChunk, jobs, workers)
+            for job, (chunk, skipped) in zip(jobs, results):
+                addLz4Stats(stats, len(job[1]), skipped)
+                dst += len(chunk).to_bytes(4, byteorder='little')
+                dst += chunk
+        return dst
 
+    def decompress(self, src, size = 0, workers = 1):
+        dst = bytearray()
+        if len(src) > 0:
+            src = memoryview(src)
+            numChunks = src[0]
+            if numChunks == 0:
+                dst = self.decompressBlock(src[1:], size)
+            else:
+                jobs = []
+                srcPtr = 1
+                for i in range(numChunks):
+                    chunkSize = int.from_bytes(src[srcPtr:srcPtr + 4], 'little')
+                    srcPtr += 4
+                    maxSize = 0
+                    if self.needsOutputSize:
+                        # Worst case output size of the chunk, when it is known
+                        maxSize = min(size, 255 * chunkSize + 16)
+                    jobs.append((self.name, src[srcPtr:srcPtr + chunkSize], maxSize))
+                    srcPtr += chunkSize
+                for chunk in mapLz4Jobs(decompressChunk, jobs, workers):
+                    dst += chunk
+        return dst
 
-def usdInt32Compress(values):
-    values = values.copy()
+    def compressStream(self, file, chunks, level = 0, acceleration = 1,
+                       chunkSize = LZ4_STREAM_CHUNK_SIZE, skipRatio = LZ4_SKIP_RATIO,
+                       stats = None, inputSize = None):
+        # Writes the same stream as compress, holding at most one chunk of
+        # input in memory, returns the uncompressed and compressed sizes.
+        # The input size, when known, enlarges the chunks to fit the count
+        if inputSize != None:
+            if inputSize > LZ4_MAX_CHUNKS * MAX_BLOCK_INPUT_SIZE:
+                raise ValueError('Buffer Too Large for LZ4 Compression')
+            chunkSize = max(chunkSize, -(-inputSize // LZ4_MAX_CHUNKS))
+        start = file.tell()
+        inputSize = 0
+        numChunks = 0
+        firstBlock = None
+        for block in iterLz4Chunks(chunks, chunkSize):
+            inputSize += len(block)
+            size = len(block)
+            block, skipped = compressChunk((self.name, block, level, acceleration, skipRatio))
+            addLz4Stats(stats, size, skipped)
+            numChunks += 1
+            if numChunks == 1:
+                # Single blocks have no size, so wait for a second chunk
+                firstBlock = block
+                continue
+            if numChunks == 2:
+                file.write(bytes(1))
+                file.write(len(firstBlock).to_bytes(4, byteorder='little'))
+                file.write(firstBlock)
+                firstBlock = None
+            if numChunks > LZ4_MAX_CHUNKS:
+                raise ValueError('Too many LZ4 chunks, pass the input size to compressStream')
+            file.write(len(block).to_bytes(4, byteorder='little'))
+            file.write(block)
+        if numChunks == 1:
+            file.write(bytes(1))
+            file.write(firstBlock)
+        elif numChunks > 1:
+            # Back patch the chunk count
+            end = file.tell()
+            file.seek(start)
+            file.write(bytes((numChunks,)))
+            file.seek(end)
+        return inputSize, file.tell() - start
+
+
+class NativeLz4Codec(Lz4Codec):
+    """LZ4 Codec using the lz4 package block functions"""
+    name = 'native'
+    needsOutputSize = True
+
+    def compressBlock(self, src, level = 0, acceleration = 1):
+        if level >= LZ4HC_MIN_LEVEL:
+            return lz4block.compress(src, mode='high_compression',
+                                     compression=level, store_size=False)
+        return lz4block.compress(src, mode='fast', acceleration=acceleration,
+                                 store_size=False)
+
+    def decompressBlock(self, src, size = 0):
+        if size <= 0:
+            # The native decoder needs the output size up front
+            return lz4DecompressChunk(src)
+        return lz4block.decompress(src, uncompressed_size=size)
+
+
+LZ4_CODECS = {}
+lz4Backend = None
+
+def registerLz4Codec(codec):
+    LZ4_CODECS[codec.name] = codec
+
+def setLz4Backend(name = None):
+    # Force a backend by name, or None for the fastest available
+    global lz4Backend
+    lz4Backend = name
+
+def getLz4Codec(name = None):
+    if name == None:
+        name = lz4Backend
+    if name == None:
+        name = 'native' if 'native' in LZ4_CODECS else 'python'
+    if not name in LZ4_CODECS:
+        print('LZ4 Backend Not Available:', name)
+        name = 'python'
+    return LZ4_CODECS[name]
+
+registerLz4Codec(Lz4Codec())
+if lz4block != None:
+    registerLz4Codec(NativeLz4Codec())
+
+
+def iterLz4Chunks(chunks, chunkSize):
+    # Pieces are gathered in one buffer and each chunk is copied out once
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        if len(buffer) > chunkSize:
+            start = 0
+            with memoryview(buffer) as view:
+                while len(buffer) - start > chunkSize:
+                    yield view[start:start + chunkSize].tobytes()
+                    start += chunkSize
+            del buffer[:start]
+    if len(buffer) > 0:
+        yield buffer
+
+def compressChunk(job):
+    # Returns the block and whether it was stored as literals
+    name, chunk, level, acceleration, skipRatio = job
+    codec = LZ4_CODECS[name]
+    if not codec.isCompressible(chunk, skipRatio):
+        return lz4LiteralBlock(chunk), True
+    return codec.compressBlock(chunk, level, acceleration), False
+
+def addLz4Stats(stats, size, skipped):
+    if stats != None:
+        key = 'skipped' if skipped else 'compressed'
+        stats[key] = stats.get(key, 0) + size
+
+def decompressChunk(job):
+    name, chunk, size = job
+    return LZ4_CODECS[name].decompressBlock(chunk, size)
+
+def mapLz4Jobs(func, jobs, workers = 1):
+    # Independent chunks are spread over a process pool when asked for
+    if workers > 1 and len(jobs) > 1:
+        jobs = [(job[0], bytes(job[1])) + job[2:] for job in jobs]
+        try:
+            with ProcessPoolExecutor(min(workers, len(jobs))) as pool:
+                return list(pool.map(func, jobs))
+        except (OSError, RuntimeError) as e:
+            print('LZ4 Process Pool Failed:', e)
+    return [func(job) for job in jobs]
+
+
+def lz4Compress(src, level = 0, acceleration = 1, skipRatio = LZ4_SKIP_RATIO):
+    return LZ4_CODECS['python'].compress(src, level, acceleration, skipRatio=skipRatio)
+
+def lz4Decompress(src, size = 0):
+    return LZ4_CODECS['python'].decompress(src, size)
+
+
+def usdInt32CompressedSize(numInts):
+    return usdIntCompressedSize(numInts, 4)
+
+def usdIntCompressedSize(numInts, intSize):
+    return intSize + (numInts * 2 + 7) // 8 + intSize * numInts
+
+
+def usdIntCodeSizes(intSize):
+    # Byte sizes for the common, small, medium and large codes
+    return (0, intSize // 4, intSize // 2, intSize)
+
+
+def usdIntCompress(values, intSize = 4):
+    if np != None and len(values) >= NUMPY_MIN_INTS:
+        return usdIntCompressNumpy(values, intSize)
+    values = list(values)
     data = bytearray()
     if len(values) == 0:
         return data
@@ -282,29 +794,65 @@ def usdInt32Compress(values):
         values[i] = value - preValue
         preValue = value
     commonValue = Counter(values).most_common()[0][0]
-    data += commonValue.to_bytes(4, 'little', signed=True) + data
+    sizes = usdIntCodeSizes(intSize)
+    data += commonValue.to_bytes(intSize, 'little', signed=True)
     data += bytes((len(values) * 2 + 7) // 8)
     for v in range(len(values)):
         value = values[v]
-        i = v + 16
+        i = v + intSize * 4
         if value != commonValue:
-            if value.bit_length() < 8:
-                data[i//4] |= 1 << ((i%4)*2)
-                data += value.to_bytes(1, 'little', signed=True)
-            elif value.bit_length() < 16:
-                data[i//4] |= 2 << ((i%4)*2)
-                data += value.to_bytes(2, 'little', signed=True)
+            if value.bit_length() < sizes[1] * 8:
+                code = 1
+            elif value.bit_length() < sizes[2] * 8:
+                code = 2
             else:
-                data[i//4] |= 3 << ((i%4)*2)
-                data += value.to_bytes(4, 'little', signed=True)
+                code = 3
+            data[i//4] |= code << ((i%4)*2)
+            data += value.to_bytes(sizes[code], 'little', signed=True)
     return data
 
 
-def usdInt32Decompress(data, numInts):
+def usdIntCompressNumpy(values, intSize = 4):
+    values = np.asarray(values, dtype=np.int64)
+    if len(values) == 0:
+        return bytearray()
+    deltas = np.diff(values, prepend=np.int64(0))
+    # Most common delta, ties go to the first one seen like Counter
+    unique, first, counts = np.unique(deltas, return_index=True, return_counts=True)
+    common = counts == counts.max()
+    commonValue = int(unique[common][np.argmin(first[common])])
+    sizes = usdIntCodeSizes(intSize)
+    magnitudes = np.abs(deltas)
+    codes = np.full(len(deltas), 3, dtype=np.uint8)
+    codes[magnitudes < (1 << (sizes[2] * 8 - 1))] = 2
+    codes[magnitudes < (1 << (sizes[1] * 8 - 1))] = 1
+    codes[deltas == commonValue] = 0
+    # Pack four 2 bit codes per byte
+    padded = np.zeros((len(codes) + 3) // 4 * 4, dtype=np.uint8)
+    padded[:len(codes)] = codes
+    packed = padded[0::4] | (padded[1::4] << 2) | (padded[2::4] << 4) | (padded[3::4] << 6)
+    # Scatter the little endian bytes of each delta at its offset
+    widths = np.array(sizes, dtype=np.int64)[codes]
+    offsets = np.cumsum(widths) - widths
+    vints = np.zeros(int(widths.sum()), dtype=np.uint8)
+    unsigned = deltas.view(np.uint64)
+    for k in range(intSize):
+        mask = widths > k
+        vints[offsets[mask] + k] = (unsigned[mask] >> np.uint64(8 * k)) & np.uint64(0xFF)
+    data = bytearray(commonValue.to_bytes(intSize, 'little', signed=True))
+    data += packed.tobytes()
+    data += vints.tobytes()
+    return data
+
+
+def usdIntDecompress(data, numInts, intSize = 4):
+    if np != None and numInts >= NUMPY_MIN_INTS:
+        return usdIntDecompressNumpy(data, numInts, intSize)
     values = []
+    sizes = usdIntCodeSizes(intSize)
     numCodes = (numInts * 2 + 7) // 8
-    commonValue = int.from_bytes(data[:4], 'little', signed=True)
-    data = data[4:]
+    commonValue = int.from_bytes(data[:intSize], 'little', signed=True)
+    data = data[intSize:]
     codes = memoryview(data)[:numCodes]
     vints = memoryview(data)[numCodes:]
     preValue = 0
@@ -314,43 +862,51 @@ def usdInt32Decompress(data, numInts):
         code = (codes[cp//4] >> (cp%4)*2) & 0x3
         if code == 0:
             preValue += commonValue
-        elif code == 1:
-            preValue += int.from_bytes(vints[vp:vp+1], 'little', signed=True)
-            vp += 1
-        elif code == 2:
-            preValue += int.from_bytes(vints[vp:vp+2], 'little', signed=True)
-            vp += 2
         else:
-            preValue += int.from_bytes(vints[vp:vp+4], 'little', signed=True)
-            vp += 4
+            size = sizes[code]
+            preValue += int.from_bytes(vints[vp:vp+size], 'little', signed=True)
+            vp += size
         values.append(preValue)
         cp += 1
     return values
 
 
-def usdInt64Decompress(data, numInts):
-    values = []
+def usdIntDecompressNumpy(data, numInts, intSize = 4):
+    data = np.frombuffer(data, dtype=np.uint8)
+    sizes = usdIntCodeSizes(intSize)
     numCodes = (numInts * 2 + 7) // 8
-    commonValue = int.from_bytes(data[:8], 'little', signed=True)
-    data = data[8:]
-    codes = memoryview(data)[:numCodes]
-    vints = memoryview(data)[numCodes:]
-    preValue = 0
-    cp = 0
-    vp = 0
-    while cp < numInts:
-        code = (codes[cp//4] >> (cp%4)*2) & 0x3
-        if code == 0:
-            preValue += commonValue
-        elif code == 1:
-            preValue += int.from_bytes(vints[vp:vp+2], 'little', signed=True)
-            vp += 2
-        elif code == 2:
-            preValue += int.from_bytes(vints[vp:vp+4], 'little', signed=True)
-            vp += 4
-        else:
-            preValue += int.from_bytes(vints[vp:vp+8], 'little', signed=True)
-            vp += 8
-        values.append(preValue)
-        cp += 1
-    return values
+    commonValue = int.from_bytes(data[:intSize].tobytes(), 'little', signed=True)
+    codes = data[intSize:intSize + numCodes]
+    codes = (codes[:, None] >> np.array([0, 2, 4, 6], dtype=np.uint8)) & 3
+    codes = codes.reshape(-1)[:numInts]
+    widths = np.array(sizes, dtype=np.int64)[codes]
+    offsets = np.cumsum(widths) - widths + intSize + numCodes
+    # Gather the little endian bytes, then sign extend each width
+    unsigned = np.zeros(numInts, dtype=np.uint64)
+    for k in range(intSize):
+        mask = widths > k
+        unsigned[mask] |= data[offsets[mask] + k].astype(np.uint64) << np.uint64(8 * k)
+    deltas = unsigned.view(np.int64)
+    for size in sizes[1:]:
+        if size < 8:
+            mask = widths == size
+            sign = 1 << (size * 8 - 1)
+            deltas[mask] = (deltas[mask] ^ sign) - sign
+    deltas[codes == 0] = commonValue
+    values = np.cumsum(deltas)
+    if intSize == 4:
+        values = values.astype(np.int32)
+    return values.tolist()
+
+
+def usdInt32Compress(values):
+    return usdIntCompress(values, 4)
+
+def usdInt64Compress(values):
+    return usdIntCompress(values, 8)
+
+def usdInt32Decompress(data, numInts):
+    return usdIntDecompress(data, numInts, 4)
+
+def usdInt64Decompress(data, numInts):
+    return usdIntDecompress(data, numInts, 8)
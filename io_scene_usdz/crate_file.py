@@ -1,13 +1,58 @@
+import io
 import os
+import sys
+import mmap
+import time
 import struct
+import json
+import hashlib
+import fnmatch
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import chain
 from io_scene_usdz.compression_utils import *
 from io_scene_usdz.value_types import *
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 ARRAY_BIT = (1 << 63)
 INLINE_BIT = (1 << 62)
 COMPRESSED_BIT = (1 << 61)
 PAYLOAD_MASK = (1 << 48) - 1
 
+MIN_COMPRESSED_ARRAY_SIZE = 16
+MAX_LOOKUP_TABLE_SIZE = 1024
+
+DATA_INDEX_MIN_SIZE = 0
+DATA_INDEX_MAX_BYTES = 32 * 1024 * 1024
+# OrderedDict slot and link of an index entry
+DATA_INDEX_NODE_SIZE = 112
+DATA_INDEX_DIGEST_SIZE = 16
+
+# Little endian NumPy types of the crate array element types
+NUMPY_DTYPES = {'e': '<f2', 'f': '<f4', 'd': '<f8', 'i': '<i4'}
+
+# Version of the path to spec sidecar index written for queries
+QUERY_INDEX_VERSION = 1
+
+# Attribute fields that can be decoded when first used
+LAZY_FIELDS = ('default', 'timeSamples')
+
+# Sections in Table of Contents order with the tables each one is built from
+CRATE_SECTIONS = (
+    ('TOKENS', ('tokens',)),
+    ('STRINGS', ('strings',)),
+    ('FIELDS', ('fields', 'reps')),
+    ('FIELDSETS', ('fsets',)),
+    ('PATHS', ('paths',)),
+    ('SPECS', ('specs',)),
+)
+
 def writeInt(file, value, size, byteorder='little', signed=False):
     file.write(value.to_bytes(size, byteorder=byteorder, signed=signed))
 
@@ -23,11 +68,6 @@ def toSigned32(n):
     n = n & 0xffffffff
     return (n ^ 0x80000000) - 0x80000000
 
-def writeInt32Compressed(file, data):
-    buffer = lz4Compress(usdInt32Compress(data))
-    writeInt(file, len(buffer), 8)
-    file.write(buffer)
-
 def writeToAlign(file, size):
     bufBytes = file.tell() % size
     if bufBytes > 0:
@@ -37,28 +77,163 @@ def readInt(file, size, byteorder='little', signed=False):
     buffer = file.read(size)
     return int.from_bytes(buffer, byteorder=byteorder, signed=signed)
 
-def readInt32Compressed(file, numInts):
-    size = readInt(file, 8)
-    buffer = lz4Decompress(file.read(size))
-    return usdInt32Decompress(buffer, numInts)
-
-def dataKey(data):
-    if type(data) == list:
-        return tuple(data)
-    return data
+def getComponentCount(vType):
+    size = int(vType.name[-2])
+    if vType.name[:6] == 'matrix':
+        return size * size
+    return size
 
+def toValueList(data):
+    # Scalar arrays are written from lists, typed arrays are converted
+    if type(data) is list:
+        return data
+    if hasattr(data, 'tolist'):
+        return data.tolist()
+    return list(data)
+
+def getPackType(vType):
+    # Struct code of the components, halfs are 'e' and not shorts
+    packType = vType.name[-1]
+    return 'e' if packType == 'h' else packType
+
+def packArray(data, vType):
+    # Pack a list of vectors or matrices, or a buffer of their components,
+    # in a single call and return the element count with the packed data
+    packType = getPackType(vType)
+    size = getComponentCount(vType)
+    if np != None and isinstance(data, np.ndarray):
+        data = np.ascontiguousarray(data, dtype='<' + packType).reshape(-1)
+    elif isinstance(data, array) and packType == 'e':
+        # The array module has no half type
+        values = data.tolist()
+        return len(values) // size, struct.pack('<%de' % len(values), *values)
+    elif isinstance(data, array) and (data.typecode != packType or sys.byteorder != 'little'):
+        data = array(packType, data)
+        if sys.byteorder != 'little':
+            data.byteswap()
+    if isBufferValue(data):
+        data = memoryview(data).cast('B')
+        return data.nbytes // (size * struct.calcsize(packType)), data
+    values = list(chain.from_iterable(data))
+    if vType.name[:6] == 'matrix':
+        values = list(chain.from_iterable(values))
+    return len(data), struct.pack('<%d%s' % (len(values), packType), *values)
+
+
+def packData(data, vType):
+    # Packed bytes of a value, used to key the index of written data
+    if vType.name[:3] == 'vec' or vType.name[:6] == 'matrix':
+        return packArray(data if isArrayValue(data) else [data], vType)[1]
+    if vType == ValueType.float or vType == ValueType.double:
+        packType = 'f' if vType == ValueType.float else 'd'
+        if np != None and isinstance(data, np.ndarray):
+            return np.ascontiguousarray(data, dtype='<' + packType).tobytes()
+        if type(data) == list:
+            return struct.pack('<%d%s' % (len(data), packType), *data)
+    if np != None and isinstance(data, np.ndarray):
+        return np.ascontiguousarray(data).tobytes()
+    if isBufferValue(data):
+        return memoryview(data).cast('B')
+    if type(data) == list and all(type(i) == int for i in data):
+        return encodeInts(data, 8, signed=True)
+    return repr(data).encode()
+
+
+def getObjectSize(value):
+    # Size of a value with the tuples and numbers inside it
+    size = sys.getsizeof(value)
+    if type(value) is tuple:
+        size += sum(getObjectSize(v) for v in value)
+    return size
+
+def getIndexEntrySize(key, ref):
+    # Bytes held by a DataIndex entry, the type and tag objects are shared
+    vType, isArray, size, digest, tag = key
+    return (sys.getsizeof(key) + sys.getsizeof(size) + getObjectSize(digest) +
+            sys.getsizeof(ref) + DATA_INDEX_NODE_SIZE)
+
+
+class DataIndex:
+    """Digest Keyed Index of Written Values"""
+    def __init__(self, minSize = DATA_INDEX_MIN_SIZE, maxBytes = DATA_INDEX_MAX_BYTES):
+        self.minSize = minSize
+        self.maxBytes = maxBytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.evictions = 0
+        self.savedBytes = 0
+
+    def getKey(self, data, vType, packed = None, tag = None):
+        # Values smaller than minSize are not indexed and get no key,
+        # the tag keeps values written in different layouts apart
+        if packed is None:
+            packed = packData(data, vType)
+        size = len(memoryview(packed).cast('B'))
+        if size < self.minSize:
+            self.skipped += 1
+            return None
+        digest = hashlib.blake2b(packed, digest_size=DATA_INDEX_DIGEST_SIZE).digest()
+        return (vType, isArrayValue(data), size, digest, tag)
+
+    def getValueKey(self, value, vType, size, tag = None):
+        # Small tuple values are cheaper to key by value than by digest
+        if size < self.minSize:
+            self.skipped += 1
+            return None
+        return (vType, False, size, value, tag)
+
+    def get(self, key):
+        if key is None:
+            return -1
+        ref = self.entries.get(key, -1)
+        if ref < 0:
+            self.misses += 1
+            return -1
+        self.entries.move_to_end(key)
+        self.hits += 1
+        self.savedBytes += key[2]
+        return ref
+
+    def add(self, key, ref):
+        if key is None or key in self.entries:
+            return
+        self.entries[key] = ref
+        self.size += getIndexEntrySize(key, ref)
+        # Evict the least recently used values once over budget
+        while self.size > self.maxBytes and len(self.entries) > 0:
+            key, ref = self.entries.popitem(last=False)
+            self.size -= getIndexEntrySize(key, ref)
+            self.evictions += 1
+
+    def printStats(self):
+        print('Data Index: %d hits, %d misses, %d skipped, %d evictions, %d bytes saved' %
+              (self.hits, self.misses, self.skipped, self.evictions, self.savedBytes))
+
+
+def getSampleSize(value, vType):
+    # Bytes writeValue uses for a vector, quaternion or matrix sample
+    count = len(value)
+    if count > 0 and type(value[0]) is tuple:
+        count *= len(value[0])
+    return count * struct.calcsize(vType.name[-1])
 
 def writeValue(file, value, vType):
-    if type(value) == list:
+    if isArrayValue(value) and (vType.name[:3] == 'vec' or vType.name[:6] == 'matrix'):
+        count, data = packArray(value, vType)
+        writeInt(file, count, 8)
+        file.write(data)
+    elif type(value) == list:
         writeInt(file, len(value), 8)
         for v in value:
             writeValue(file, v, vType)
     elif vType.name[:6] == 'matrix':
-        packStr = '<'+vType.name[-2:]
-        for row in value:
-            file.write(struct.pack(packStr, *row))
+        values = list(chain.from_iterable(value))
+        file.write(struct.pack('<%d%s' % (len(values), vType.name[-1]), *values))
     elif vType.name[:3] == 'vec':
-        packStr = '<'+vType.name[-2:]
+        packStr = '<%d%s' % (len(value), getPackType(vType))
         file.write(struct.pack(packStr, *value))
     elif vType.name == 'quatf':
         packStr = '<ffff'
@@ -84,19 +259,50 @@ def isWholeBytes(vector):
             return False
     return True
 
-def compare(lhs, rhs):
-    lhType = type(lhs)
-    rhType = type(rhs)
-    if lhType != rhType:
-        return False
-    if lhType == list or lhType == tuple:
-        if len(lhs) != len(rhs):
-            return False
-        for i in range(len(lhs)):
-            if not compare(lhs[i], rhs[i]):
-                return False
-            return True
-    return lhs == rhs
+def roundFloats(values, packType):
+    # Values as they will read back once packed
+    packStr = '<%d%s' % (len(values), packType)
+    return struct.unpack(packStr, struct.pack(packStr, *values))
+
+def getWholeInts(values, packType = 'f'):
+    # Integer values of a float array, or None if any of them are not
+    # whole numbers in the int32 range
+    if np != None:
+        array = np.asarray(values, dtype=packType)
+        if np.all(np.isfinite(array)) and np.all(array == np.trunc(array)) and \
+           array.min() >= -2**31 and array.max() < 2**31:
+            return array.astype(np.int64).tolist()
+        return None
+    ints = []
+    for f in roundFloats(values, packType):
+        if not f.is_integer() or f < -2**31 or f >= 2**31:
+            return None
+        ints.append(int(f))
+    return ints
+
+def getLookupTable(values, packType = 'f'):
+    # Distinct values in the order first seen and a table index per value,
+    # or (None, None) when there are too many distinct values
+    maxSize = min(len(values) // 4, MAX_LOOKUP_TABLE_SIZE)
+    if np != None:
+        array = np.asarray(values, dtype=packType)
+        if np.any(np.isnan(array)):
+            return None, None
+        unique, first, inverse = np.unique(array, return_index=True, return_inverse=True)
+        if len(unique) > maxSize:
+            return None, None
+        order = np.argsort(first)
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        return array[first[order]].tolist(), rank[inverse.reshape(-1)].tolist()
+    table = {}
+    indices = []
+    for f in roundFloats(values, packType):
+        index = table.setdefault(f, len(table))
+        if index == maxSize or f != f:
+            return None, None
+        indices.append(index)
+    return list(table.keys()), indices
 
 def decodeRep(data):
     rep = {}
@@ -108,37 +314,267 @@ def decodeRep(data):
     rep['value'] = None
     return rep
 
+def isCompressedArray(rep, count):
+    # Arrays below the minimum size are stored plain even when flagged
+    return rep['compressed'] and count >= MIN_COMPRESSED_ARRAY_SIZE
+
+def isLazyRep(data):
+    # Arrays and time samples are worth deferring, inline values are not
+    return (data & ARRAY_BIT) != 0 or ((data >> 48) & 0xFF) == ValueType.TimeSamples.value
+
+def splitPathRules(rules):
+    # Path prefixes, prim class type names and property name patterns
+    paths = []
+    classes = set()
+    names = []
+    for rule in rules if rules != None else ():
+        if isinstance(rule, ClassType):
+            classes.add(rule.name)
+        elif rule.startswith('/'):
+            paths.append(rule.rstrip('/'))
+        else:
+            names.append(rule)
+    return (paths, classes, names)
+
+def matchPathPrefix(pathStr, prefixes):
+    for prefix in prefixes:
+        if prefix == '' or pathStr == prefix or pathStr.startswith(prefix + '/') or pathStr.startswith(prefix + '.'):
+            return True
+    return False
+
+def matchPropertyName(name, patterns):
+    for pattern in patterns:
+        if fnmatch.fnmatchcase(name, pattern):
+            return True
+    return False
+
 def makeIdentityMatrix(size):
     return tuple((0,)*i + (1,) + (0,)*(size-i-1) for i in range(size))
 
 
+def writeCrateSection(job):
+    # Writes a single section to its own buffer, so that sections can be
+    # encoded in a process pool and copied to the file in order
+    name, settings, tables = job
+    start = time.perf_counter()
+    crate = CrateFile(io.BytesIO(), *settings)
+    for key, value in tables.items():
+        setattr(crate, key, value)
+    crate.section = name
+    crate.getSectionWriter(name)()
+    stats = crate.compressionStats.get(name)
+    return crate.file.getvalue(), stats, time.perf_counter() - start
+
+
+class CrateBuffer:
+    """Memory Mapped Crate File Reader"""
+    def __init__(self, buffer, offset = 0, size = None):
+        self.view = memoryview(buffer)
+        if self.view.format != 'B':
+            self.view = self.view.cast('B')
+        end = len(self.view) if size == None else offset + size
+        self.buffer = self.view[offset:end]
+        self.size = len(self.buffer)
+        self.pos = 0
+        self.mapping = None
+
+    def seek(self, pos, whence = 0):
+        if whence == 1:
+            pos += self.pos
+        elif whence == 2:
+            pos += self.size
+        self.pos = max(pos, 0)
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def read(self, size = -1):
+        start = self.pos
+        if size < 0:
+            self.pos = self.size
+        else:
+            self.pos = min(start + size, self.size)
+        return self.buffer[start:self.pos]
+
+    def unpack(self, fmt):
+        values = struct.unpack_from(fmt, self.buffer, self.pos)
+        self.pos += struct.calcsize(fmt)
+        return values
+
+    def readInt(self, size, signed = False):
+        code = getIntTypeCode(size, signed)
+        if code == None or self.pos + size > self.size:
+            return int.from_bytes(self.read(size), 'little', signed=signed)
+        value = struct.unpack_from('<' + code, self.buffer, self.pos)[0]
+        self.pos += size
+        return value
+
+    def close(self):
+        self.buffer.release()
+        self.view.release()
+        if self.mapping != None:
+            try:
+                self.mapping.close()
+            except BufferError:
+                # Still exported, closed once the last view is collected
+                pass
+
+
+def mapCrateFile(file, offset = 0, size = None):
+    # Maps a crate file, or a crate stored at an offset in a larger file
+    # like an uncompressed usdz entry, so reads do not touch the file
+    if isinstance(file, (bytes, bytearray, memoryview, mmap.mmap)):
+        return CrateBuffer(file, offset, size)
+    if isinstance(file, io.BytesIO):
+        return CrateBuffer(file.getbuffer(), offset, size)
+    try:
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        file.seek(0)
+        return CrateBuffer(file.read(), offset, size)
+    buffer = CrateBuffer(mapping, offset, size)
+    buffer.mapping = mapping
+    return buffer
+
+
+class PathNode:
+    """Path Tree Entry of a Streamed Prim"""
+    def __init__(self, pathStr, pathIndex, token):
+        self.pathStr = pathStr
+        self.pathIndex = pathIndex
+        self.token = token
+        self.position = 0
+        self.fset = None
+        self.children = []
+        self.properties = []
+
+
 class CrateFile:
-    def __init__(self, file):
+    def __init__(self, file, compressionLevel = 0, backend = None,
+                 chunkSize = LZ4_CHUNK_SIZE, workers = 1, skipRatio = LZ4_SKIP_RATIO,
+                 dedupMinSize = DATA_INDEX_MIN_SIZE, dedupMaxBytes = DATA_INDEX_MAX_BYTES,
+                 sectionWorkers = 1):
         self.file = file
+        self.compressionLevel = compressionLevel
+        self.codec = getLz4Codec(backend)
+        self.chunkSize = chunkSize
+        self.workers = workers
+        self.skipRatio = skipRatio
+        self.sectionWorkers = sectionWorkers
         self.version = 6
         self.toc = []
         self.tokenMap = {}
         self.tokens = []
         self.strings = []
+        self.stringsMap = {}
         self.fields = []
-        self.reps = []
+        self.reps = array('Q')
         self.repsMap = {}
         self.fsets = []
+        self.fsetsMap = {}
         self.paths = []
         self.specs = []
         self.specsMap = {}
-        self.writenData = {}
-        self.framesRef = -1
+        self.dataIndex = DataIndex(dedupMinSize, dedupMaxBytes)
+        self.compressedData = set()
+        self.pathIndices = None
+        self.primStack = []
+        self.section = 'DATA'
+        self.lazy = False
+        self.memoize = True
+        self.tuples = False
+        self.skipFields = ()
+        self.pathItems = {}
+        self.pathParents = array('i')
+        self.pathTokens = array('i')
+        self.pathPrims = bytearray()
+        self.pathStrings = []
+        self.pathEntries = {}
+        self.queryPaths = None
+        self.queryPathStrs = {}
+        self.queryPathList = []
+        self.queryParents = []
+        self.queryChildren = None
+        self.compressionStats = {}
+        self.sectionTimes = {}
+
+    def getSectionStats(self):
+        # Bytes skipped and compressed for the section being written
+        return self.compressionStats.setdefault(self.section, {'skipped': 0, 'compressed': 0})
+
+    def printCompressionStats(self):
+        for section, stats in self.compressionStats.items():
+            print('%s: %d bytes compressed, %d bytes skipped' % (section, stats['compressed'], stats['skipped']))
+
+    def printSectionTimes(self):
+        for section, seconds in self.sectionTimes.items():
+            print('%s: %.3f seconds' % (section, seconds))
+
+    def compress(self, buffer):
+        return self.codec.compress(buffer, self.compressionLevel,
+                                   chunkSize=self.chunkSize, workers=self.workers,
+                                   skipRatio=self.skipRatio, stats=self.getSectionStats())
+
+    def decompress(self, buffer, size = 0):
+        return self.codec.decompress(buffer, size, self.workers)
+
+    def writeCompressedStream(self, chunks, inputSize, writeInputSize = False):
+        # Reserve the size headers and back patch them once compressed
+        sizeStart = self.file.tell()
+        writeInt(self.file, 0, 16 if writeInputSize else 8)
+        chunkSize = min(self.chunkSize, LZ4_STREAM_CHUNK_SIZE)
+        inputSize, size = self.codec.compressStream(self.file, chunks,
+                                                    self.compressionLevel,
+                                                    chunkSize=chunkSize,
+                                                    skipRatio=self.skipRatio,
+                                                    stats=self.getSectionStats(),
+                                                    inputSize=inputSize)
+        end = self.file.tell()
+        self.file.seek(sizeStart)
+        if writeInputSize:
+            writeInt(self.file, inputSize, 8)
+        writeInt(self.file, size, 8)
+        self.file.seek(end)
+
+    def writeInt32Compressed(self, data):
+        buffer = self.compress(usdInt32Compress(data))
+        writeInt(self.file, len(buffer), 8)
+        self.file.write(buffer)
+
+    def readInt32Compressed(self, numInts):
+        size = self.file.readInt(8)
+        buffer = self.decompress(self.file.read(size), usdInt32CompressedSize(numInts))
+        return usdInt32Decompress(buffer, numInts)
+
+    def writeFloatArray(self, data, packType = 'f'):
+        # Float and double arrays are written as compressed integers or as a
+        # lookup table with compressed indices when possible
+        writeInt(self.file, len(data), 8)
+        if len(data) >= MIN_COMPRESSED_ARRAY_SIZE:
+            ints = getWholeInts(data, packType)
+            if ints != None:
+                self.file.write(b'i')
+                self.writeInt32Compressed(ints)
+                return True
+            table, indices = getLookupTable(data, packType)
+            if table != None:
+                self.file.write(b't')
+                writeInt(self.file, len(table), 4)
+                self.file.write(struct.pack('<%d%s' % (len(table), packType), *table))
+                self.writeInt32Compressed(indices)
+                return True
+        self.file.write(struct.pack('<%d%s' % (len(data), packType), *data))
+        return False
 
-    def addWritenData(self, data, vType, ref):
-        key = (dataKey(data), vType)
-        self.writenData[key] = ref
+    def getDataKey(self, data, vType, packed = None):
+        return self.dataIndex.getKey(data, vType, packed)
 
-    def getDataRefrence(self, data, vType):
-        key = (dataKey(data), vType)
-        if key in self.writenData:
-            return self.writenData[key]
-        return -1
+    def addWritenData(self, key, ref):
+        self.dataIndex.add(key, ref)
+
+    def getDataRefrence(self, key):
+        return self.dataIndex.get(key)
 
     def getTokenIndex(self, token):
         if not token in self.tokenMap:
@@ -148,12 +584,17 @@ class CrateFile:
 
     def getStringIndex(self, str):
         tokenIndex = self.getTokenIndex(str)
-        if not tokenIndex in self.strings:
+        if not tokenIndex in self.stringsMap:
+            self.stringsMap[tokenIndex] = len(self.strings)
             self.strings.append(tokenIndex)
-        return self.strings.index(tokenIndex)
+        return self.stringsMap[tokenIndex]
 
     def addFieldSet(self, fset):
+        key = tuple(fset)
+        if key in self.fsetsMap:
+            return self.fsetsMap[key]
         index = len(self.fsets)
+        self.fsetsMap[key] = index
         self.fsets += fset
         self.fsets.append(-1)
         return index
@@ -182,10 +623,11 @@ class CrateFile:
             for token in data:
                 token = token.replace('"', '')
                 tokens.append(self.getTokenIndex(token))
-            ref = self.getDataRefrence(tokens, ValueType.token)
+            key = self.getDataKey(tokens, ValueType.token)
+            ref = self.getDataRefrence(key)
             if ref < 0:
                 ref = self.file.tell()
-                self.addWritenData(tokens, ValueType.token, ref)
+                self.addWritenData(key, ref)
                 writeInt(self.file, len(tokens), 8)
                 for token in tokens:
                     writeInt(self.file, token, 4)
@@ -204,10 +646,11 @@ class CrateFile:
         for token in tokens:
             token = token.replace('"', '')
             data.append(self.getTokenIndex(token))
-        ref = self.getDataRefrence(data, ValueType.TokenVector)
+        key = self.getDataKey(data, ValueType.TokenVector)
+        ref = self.getDataRefrence(key)
         if ref < 0:
             ref = self.file.tell()
-            self.addWritenData(data, ValueType.TokenVector, ref)
+            self.addWritenData(key, ref)
             writeInt(self.file, len(data), 8)
             for token in data:
                 writeInt(self.file, token, 4)
@@ -233,7 +676,7 @@ class CrateFile:
     def addReferenceListOp(self, field, item):
         field = self.getTokenIndex(field)
         strIndex = self.getStringIndex('')
-        pathIndex = item.pathIndex
+        pathIndex = self.getTargetIndex(item)
         ref = self.file.tell()
         writeInt(self.file, 3, 1) # ListOp Type Flags (Explicit | Explicit Items)
         writeInt(self.file, 1, 8) # Vector Size (size of 1)
@@ -250,15 +693,17 @@ class CrateFile:
 
     def addFieldInt(self, field, data):
         field = self.getTokenIndex(field)
-        if type(data) == list:
+        if isArrayValue(data):
+            data = toValueList(data)
             compress = len(data) >= 16
-            ref = self.getDataRefrence(data, ValueType.int)
+            key = self.getDataKey(data, ValueType.int)
+            ref = self.getDataRefrence(key)
             if ref < 0:
                 ref = self.file.tell()
-                self.addWritenData(data, ValueType.int, ref)
+                self.addWritenData(key, ref)
                 writeInt(self.file, len(data), 8)
                 if compress:
-                    writeInt32Compressed(self.file, data)
+                    self.writeInt32Compressed(data)
                 else:
                     for i in data:
                         writeInt(self.file, i, 4, signed=True)
@@ -267,75 +712,74 @@ class CrateFile:
 
     def addFieldFloat(self, field, data):
         field = self.getTokenIndex(field)
-        if type(data) == list:
-            ref = self.getDataRefrence(data, ValueType.float)
+        if isArrayValue(data):
+            data = toValueList(data)
+            key = self.getDataKey(data, ValueType.float)
+            ref = self.getDataRefrence(key)
             if ref < 0:
                 ref = self.file.tell()
-                self.addWritenData(data, ValueType.float, ref)
-                writeInt(self.file, len(data), 8)
-                for f in data:
-                    writeFloat(self.file, f)
-            return self.addFieldItem(field, ValueType.float, True, False, False, ref)
+                self.addWritenData(key, ref)
+                if self.writeFloatArray(data, 'f'):
+                    self.compressedData.add(ref)
+            compressed = ref in self.compressedData
+            return self.addFieldItem(field, ValueType.float, True, False, compressed, ref)
         data = int.from_bytes(struct.pack('<f', data), 'little')
         return self.addFieldItem(field, ValueType.float, False, True, False, data)
 
     def addFieldDouble(self, field, data):
         field = self.getTokenIndex(field)
-        if type(data) == list:
-            ref = self.getDataRefrence(data, ValueType.double)
+        if isArrayValue(data):
+            data = toValueList(data)
+            key = self.getDataKey(data, ValueType.double)
+            ref = self.getDataRefrence(key)
             if ref < 0:
                 ref = self.file.tell()
-                self.addWritenData(data, ValueType.double, ref)
-                writeInt(self.file, len(data), 8)
-                for d in data:
-                    writeDouble(self.file, d)
-            return self.addFieldItem(field, ValueType.double, True, False, False, ref)
+                self.addWritenData(key, ref)
+                if self.writeFloatArray(data, 'd'):
+                    self.compressedData.add(ref)
+            compressed = ref in self.compressedData
+            return self.addFieldItem(field, ValueType.double, True, False, compressed, ref)
         data = int.from_bytes(struct.pack('<f', data), 'little')
         return self.addFieldItem(field, ValueType.double, False, True, False, data)
 
     def addFieldVector(self, field, data, vType):
         field = self.getTokenIndex(field)
-        packStr = '<'+vType.name[-2:]
-        if type(data) == list:
-            ref = self.getDataRefrence(data, vType)
+        packStr = '<%d%s' % (len(data), getPackType(vType))
+        if isArrayValue(data):
+            count, packed = packArray(data, vType)
+            key = self.getDataKey(data, vType, packed)
+            ref = self.getDataRefrence(key)
             if ref < 0:
                 ref = self.file.tell()
-                self.addWritenData(data, vType, ref)
-                writeInt(self.file, len(data), 8)
-                for v in data:
-                    self.file.write(struct.pack(packStr, *v))
+                self.addWritenData(key, ref)
+                writeInt(self.file, count, 8)
+                self.file.write(packed)
             return self.addFieldItem(field, vType, True, False, False, ref)
         if isWholeBytes(data):
             nBytes = 2 * len(data)
             data = [int(f) for f in data]
-            packStr = packStr.replace('f', 'b')
+            packStr = '<%db' % len(data)
             data = struct.pack(packStr, *data)
             data = int.from_bytes(data, 'little')
             return self.addFieldItem(field, vType, False, True, False, data)
         else:
-            ref = self.getDataRefrence(data, vType)
+            key = self.getDataKey(data, vType)
+            ref = self.getDataRefrence(key)
             if ref < 0:
                 ref = self.file.tell()
-                self.addWritenData(data, vType, ref)
+                self.addWritenData(key, ref)
                 self.file.write(struct.pack(packStr, *data))
             return self.addFieldItem(field, vType, False, False, False, ref)
 
     def addFieldMatrix(self, field, data, vType):
         field = self.getTokenIndex(field)
-        ref = self.getDataRefrence(data, vType)
+        key = self.getDataKey(data, vType)
+        ref = self.getDataRefrence(key)
         if ref < 0:
             ref = self.file.tell()
-            self.addWritenData(data, vType, ref)
-            packStr = '<'+vType.name[-2:]
-            if type(data) == list:
-                writeInt(self.file, len(data), 8)
-                for matrix in data:
-                    for row in matrix:
-                        self.file.write(struct.pack(packStr, *row))
-            else:
-                for row in data:
-                    self.file.write(struct.pack(packStr, *row))
-        if type(data) == list:
+            self.addWritenData(key, ref)
+            writeValue(self.file, data, vType)
+        if isArrayValue(data):
             return self.addFieldItem(field, vType, True, False, False, ref)
         return self.addFieldItem(field, vType, False, False, False, ref)
 
@@ -366,43 +810,46 @@ class CrateFile:
         count = len(data)
         size = 8*(count+2)
         elem = 0
-        if type(data[0][1]) == list and len(data[0][1]) > 1:
+        if isArrayValue(data[0][1]) and len(data[0][1]) > 1:
             elem = 128
         frames = []
         refs = []
-        refMap = {}
         for frame, value in data:
             frames.append(float(frame))
-            key = dataKey(value)
-            if key in refMap:
-                refs.append(refMap[key])
+            # Sample values are raw, so keep them apart from compressed arrays
+            if type(value) is tuple:
+                key = self.dataIndex.getValueKey(value, vType, getSampleSize(value, vType), 'TimeSamples')
             else:
+                key = self.dataIndex.getKey(value, vType, tag='TimeSamples')
+            ref = self.getDataRefrence(key)
+            if ref < 0:
                 ref = self.file.tell()
                 writeValue(self.file, value, vType)
-                refMap[key] = ref
-                refs.append(ref)
+                self.addWritenData(key, ref)
+            refs.append(ref)
         reference = self.file.tell()
-        if self.framesRef > 0:
+        # Attributes sampled at the same frames share one times array
+        packed = struct.pack('<%dd' % count, *frames)
+        key = self.dataIndex.getKey(frames, ValueType.DoubleVector, packed, 'TimeFrames')
+        ref = self.getDataRefrence(key)
+        if ref >= 0:
             writeInt(self.file, 8, 8)
-            writeInt(self.file, self.framesRef + 8, 6)
+            writeInt(self.file, ref, 6)
             writeInt(self.file, ValueType.DoubleVector.value, 1)
             writeInt(self.file, 0, 1)
         else:
-            self.framesRef = reference
+            self.addWritenData(key, reference + 8)
             writeInt(self.file, size, 8)
             writeInt(self.file, count, 8)
-            for frame in frames:
-                writeDouble(self.file, frame)
+            self.file.write(packed)
             writeInt(self.file, reference + 8, 6)
             writeInt(self.file, ValueType.DoubleVector.value, 1)
             writeInt(self.file, 0, 1)
         writeInt(self.file, 8, 8)
         writeInt(self.file, count, 8)
-        for ref in refs:
-            #print((ref, vType.value, elem))
-            writeInt(self.file, ref, 6)
-            writeInt(self.file, vType.value, 1)
-            writeInt(self.file, elem, 1)
+        # Each value is a 6 byte refrence, a type byte and an element byte
+        reps = [ref | (vType.value << 48) | (elem << 56) for ref in refs]
+        self.file.write(encodeInts(reps, 8))
         return self.addFieldItem(field, ValueType.TimeSamples, False, False, False, reference)
 
     def addField(self, field, value, vType = ValueType.UnregisteredValue):
@@ -420,6 +867,8 @@ class CrateFile:
             return self.addFieldInt(field, value)
         if vType == ValueType.float:
             return self.addFieldFloat(field, value)
+        if vType == ValueType.double:
+            return self.addFieldDouble(field, value)
         if vType.name[:3] == 'vec':
             return self.addFieldVector(field, value, vType)
         if vType.name[:6] == 'matrix':
@@ -438,57 +887,61 @@ class CrateFile:
             token *= -1
         self.paths.append((path, token, jump))
 
-    def addSpec(self, fset, sType):
-        path = len(self.specs)
+    def addSpec(self, fset, sType, path = None):
+        if path == None:
+            path = len(self.specs)
         self.specs.append((path, fset, sType.value))
         self.specsMap[path] = (fset, sType.value)
         return path
 
     def writeBootStrap(self, tocOffset = 0):
+        if tocOffset > 0:
+            # Patch the Table of Contents Offset
+            if isinstance(self.file, io.BytesIO):
+                with self.file.getbuffer() as buffer:
+                    buffer[16:24] = tocOffset.to_bytes(8, byteorder='little')
+            else:
+                end = self.file.tell()
+                self.file.seek(16)
+                writeInt(self.file, tocOffset, 8)
+                self.file.seek(end)
+            return
         self.file.seek(0)
         self.file.write(b'PXR-USDC')
         # Version
         self.file.write(b'\x00\x07\x00\x00\x00\x00\x00\x00')
         # Table of Contents Offset
-        #print('tocOffset: ', tocOffset)
         writeInt(self.file, tocOffset, 8)
         self.file.write(bytes(64))
 
     def writeTokensSection(self):
         start = self.file.tell()
         writeInt(self.file, len(self.tokens), 8)
-        buffer = bytearray()
-        for token in self.tokens:
-            buffer += token.encode() + b'\0'
-        writeInt(self.file, len(buffer), 8)
-        buffer = lz4Compress(buffer)
-        writeInt(self.file, len(buffer), 8)
-        self.file.write(buffer)
+        inputSize = sum(len(token.encode()) + 1 for token in self.tokens)
+        tokens = (token.encode() + b'\0' for token in self.tokens)
+        self.writeCompressedStream(tokens, inputSize, True)
         size = self.file.tell() - start
         self.toc.append(('TOKENS', start, size))
 
     def writeStringsSection(self):
         start = self.file.tell()
         writeInt(self.file, len(self.strings), 8)
-        for i in self.strings:
-            writeInt(self.file, i, 4)
+        self.file.write(encodeInts(self.strings, 4))
         size = self.file.tell() - start
         self.toc.append(('STRINGS', start, size))
 
     def writeFieldsSection(self):
         start = self.file.tell()
         writeInt(self.file, len(self.fields), 8)
-        writeInt32Compressed(self.file, self.fields)
-        buffer = lz4Compress(encodeInts(self.reps, 8))
-        writeInt(self.file, len(buffer), 8)
-        self.file.write(buffer)
+        self.writeInt32Compressed(self.fields)
+        self.writeCompressedStream(iterEncodedInts(self.reps, 8), len(self.reps) * 8)
         size = self.file.tell() - start
         self.toc.append(('FIELDS', start, size))
 
     def writeFieldSetsSection(self):
         start = self.file.tell()
         writeInt(self.file, len(self.fsets), 8)
-        writeInt32Compressed(self.file, self.fsets)
+        self.writeInt32Compressed(self.fsets)
         size = self.file.tell() - start
         self.toc.append(('FIELDSETS', start, size))
 
@@ -503,9 +956,9 @@ class CrateFile:
             jumps.append(jump)
         writeInt(self.file, len(self.paths), 8)
         writeInt(self.file, len(self.paths), 8)
-        writeInt32Compressed(self.file, paths)
-        writeInt32Compressed(self.file, tokens)
-        writeInt32Compressed(self.file, jumps)
+        self.writeInt32Compressed(paths)
+        self.writeInt32Compressed(tokens)
+        self.writeInt32Compressed(jumps)
         size = self.file.tell() - start
         self.toc.append(('PATHS', start, size))
 
@@ -519,19 +972,56 @@ class CrateFile:
             fsets.append(fset)
             types.append(type)
         writeInt(self.file, len(self.specs), 8)
-        writeInt32Compressed(self.file, paths)
-        writeInt32Compressed(self.file, fsets)
-        writeInt32Compressed(self.file, types)
+        self.writeInt32Compressed(paths)
+        self.writeInt32Compressed(fsets)
+        self.writeInt32Compressed(types)
         size = self.file.tell() - start
         self.toc.append(('SPECS', start, size))
 
+    def getSectionWriter(self, name):
+        writers = {
+            'TOKENS': self.writeTokensSection,
+            'STRINGS': self.writeStringsSection,
+            'FIELDS': self.writeFieldsSection,
+            'FIELDSETS': self.writeFieldSetsSection,
+            'PATHS': self.writePathsSection,
+            'SPECS': self.writeSpecsSection,
+        }
+        return writers[name]
+
     def writeSections(self):
-        self.writeTokensSection()
-        self.writeStringsSection()
-        self.writeFieldsSection()
-        self.writeFieldSetsSection()
-        self.writePathsSection()
-        self.writeSpecsSection()
+        if self.sectionWorkers > 1:
+            self.writeSectionsConcurrent()
+            return
+        for name, tables in CRATE_SECTIONS:
+            start = time.perf_counter()
+            self.section = name
+            self.getSectionWriter(name)()
+            self.sectionTimes[name] = time.perf_counter() - start
+        self.section = 'DATA'
+
+    def writeSectionsConcurrent(self):
+        # Sections are independent, each worker encodes one to a buffer
+        settings = (self.compressionLevel, self.codec.name, self.chunkSize, 1, self.skipRatio)
+        jobs = []
+        for name, tables in CRATE_SECTIONS:
+            jobs.append((name, settings, {key: getattr(self, key) for key in tables}))
+        results = None
+        try:
+            with ProcessPoolExecutor(min(self.sectionWorkers, len(jobs))) as pool:
+                results = list(pool.map(writeCrateSection, jobs))
+        except (OSError, RuntimeError) as e:
+            print('Section Process Pool Failed:', e)
+            results = [writeCrateSection(job) for job in jobs]
+        for (name, settings, tables), (buffer, stats, seconds) in zip(jobs, results):
+            start = self.file.tell()
+            self.file.write(buffer)
+            self.toc.append((name, start, len(buffer)))
+            if stats != None:
+                sectionStats = self.compressionStats.setdefault(name, {'skipped': 0, 'compressed': 0})
+                for key, size in stats.items():
+                    sectionStats[key] += size
+            self.sectionTimes[name] = seconds
 
     def writeTableOfContents(self):
         tocStart = self.file.tell()
@@ -544,9 +1034,15 @@ class CrateFile:
             writeInt(self.file, size, 8)
         self.writeBootStrap(tocStart)
 
-    def writeUsdConnection(self, usdAtt):
+    def getTargetIndex(self, item):
+        # Streamed files look targets up by path, so they may come later
+        if self.pathIndices != None:
+            return self.getPathIndex(item.getPathStr())
+        return item.pathIndex
+
+    def addConnectionFields(self, usdAtt):
         fset = []
-        pathIndex = usdAtt.value.pathIndex
+        pathIndex = self.getTargetIndex(usdAtt.value)
         fset.append(self.addField('typeName', usdAtt.value.valueTypeToString()))
         for q in usdAtt.value.qualifiers:
             if q == 'uniform':
@@ -555,25 +1051,17 @@ class CrateFile:
                 fset.append(self.addField('custom', True))
         fset.append(self.addFieldPathListOp('connectionPaths', pathIndex))
         fset.append(self.addFieldPathVector('connectionChildren', pathIndex))
-        fset = self.addFieldSet(fset)
-        usdAtt.pathIndex = self.addSpec(fset, SpecType.Attribute)
-        nameToken = self.getTokenIndex(usdAtt.name)
-        pathJump = usdAtt.getPathJump()
-        self.addPath(usdAtt.pathIndex, nameToken, pathJump, True)
+        return self.addFieldSet(fset), SpecType.Attribute
 
-    def writeUsdRelationship(self, usdAtt):
+    def addRelationshipFields(self, usdAtt):
         fset = []
-        pathIndex = usdAtt.value.pathIndex
+        pathIndex = self.getTargetIndex(usdAtt.value)
         fset.append(self.addField('variability', True, ValueType.Variability))
         fset.append(self.addFieldPathListOp('targetPaths', pathIndex))
         fset.append(self.addFieldPathVector('targetChildren', pathIndex))
-        fset = self.addFieldSet(fset)
-        usdAtt.pathIndex = self.addSpec(fset, SpecType.Relationship)
-        nameToken = self.getTokenIndex(usdAtt.name)
-        pathJump = usdAtt.getPathJump()
-        self.addPath(usdAtt.pathIndex, nameToken, pathJump, True)
+        return self.addFieldSet(fset), SpecType.Relationship
 
-    def writeUsdAttribute(self, usdAtt):
+    def addAttributeFields(self, usdAtt):
         fset = []
         fset.append(self.addField('typeName', usdAtt.valueTypeToString()))
         for q in usdAtt.qualifiers:
@@ -583,72 +1071,102 @@ class CrateFile:
                 fset.append(self.addField('custom', True))
         for name, value in usdAtt.metadata.items():
             fset.append(self.addField(name, value))
-        if usdAtt.value != None:
+        if usdAtt.value is not None:
             fset.append(self.addField('default', usdAtt.value, usdAtt.valueType))
         if usdAtt.hasTimeSamples():
             fset.append(self.addFieldTimeSamples('timeSamples', usdAtt.frames, usdAtt.valueType.name))
-        fset = self.addFieldSet(fset)
-        usdAtt.pathIndex = self.addSpec(fset, SpecType.Attribute)
+        return self.addFieldSet(fset), SpecType.Attribute
+
+    def addPropertyFields(self, usdAtt):
+        if usdAtt.isConnection():
+            return self.addConnectionFields(usdAtt)
+        if usdAtt.isRelationship():
+            return self.addRelationshipFields(usdAtt)
+        return self.addAttributeFields(usdAtt)
+
+    def writeUsdProperty(self, usdAtt):
+        fset, specType = self.addPropertyFields(usdAtt)
+        usdAtt.pathIndex = self.addSpec(fset, specType)
         nameToken = self.getTokenIndex(usdAtt.name)
-        pathJump = usdAtt.getPathJump()
+        pathJump = usdAtt.pathJump
         self.addPath(usdAtt.pathIndex, nameToken, pathJump, True)
 
-    def writeUsdPrim(self, usdPrim):
-        # Add Prim Properties
+    def addPrimFields(self, usdPrim):
+        # Fields of a prim that do not depend on its children or properties
         fset = []
         fset.append(self.addField('specifier', usdPrim.specifierType))
         if usdPrim.classType != None:
             fset.append(self.addField('typeName', usdPrim.classType.name))
         for name, value in usdPrim.metadata.items():
             if name == 'inherits':
-                path = value.pathIndex
+                path = self.getTargetIndex(value)
                 fset.append(self.addFieldPathListOp('inheritPaths', path))
             elif name == 'references':
-                fset.append(sself.addReferenceListOp(field, value))
+                fset.append(self.addReferenceListOp(name, value))
             else:
                 fset.append(self.addField(name, value))
-        if len(usdPrim.attributes) > 0:
-            tokens = [att.name for att in usdPrim.attributes]
-            fset.append(self.addFieldTokenVector('properties', tokens))
-        if len(usdPrim.children) > 0:
-            tokens = [child.name for child in usdPrim.children]
-            fset.append(self.addFieldTokenVector('primChildren', tokens))
-        fset = self.addFieldSet(fset)
-        usdPrim.pathIndex = self.addSpec(fset, SpecType.Prim)
-        nameToken = self.getTokenIndex(usdPrim.name)
-        pathJump = usdPrim.getPathJump()
-        # Add Prim Path
-        self.addPath(usdPrim.pathIndex, nameToken, pathJump, False)
-        # Write Prim Children
-        for child in usdPrim.children:
-            self.writeUsdPrim(child)
-        # Write Prim Attributes
-        for attribute in usdPrim.attributes:
-            if attribute.isConnection():
-                self.writeUsdConnection(attribute)
-            elif attribute.isRelationship():
-                self.writeUsdRelationship(attribute)
-            else:
-                self.writeUsdAttribute(attribute)
+        return fset
 
-    def writeUsd(self, usdData):
-        usdData.updatePathIndices()
-        self.writeBootStrap()
-        # Add Root Metadata
+    def writeUsdPrim(self, usdPrim):
+        # A prim is followed by its children and then by its attributes,
+        # walked with a stack so deep hierarchies do not hit the recursion limit
+        stack = [(usdPrim, False)]
+        while len(stack) > 0:
+            usdPrim, visited = stack.pop()
+            if visited:
+                # Write Prim Attributes
+                for attribute in usdPrim.attributes:
+                    self.writeUsdProperty(attribute)
+                continue
+            # Add Prim Properties
+            fset = self.addPrimFields(usdPrim)
+            if len(usdPrim.attributes) > 0:
+                tokens = [att.name for att in usdPrim.attributes]
+                fset.append(self.addFieldTokenVector('properties', tokens))
+            if len(usdPrim.children) > 0:
+                tokens = [child.name for child in usdPrim.children]
+                fset.append(self.addFieldTokenVector('primChildren', tokens))
+            fset = self.addFieldSet(fset)
+            usdPrim.pathIndex = self.addSpec(fset, SpecType.Prim)
+            nameToken = self.getTokenIndex(usdPrim.name)
+            pathJump = usdPrim.pathJump
+            # Add Prim Path
+            self.addPath(usdPrim.pathIndex, nameToken, pathJump, False)
+            # Write Prim Children
+            stack.append((usdPrim, True))
+            stack += [(child, False) for child in reversed(usdPrim.children)]
+
+    def addPseudoRootFields(self, metadata, children):
         fset = []
-        for name, value in usdData.metadata.items():
+        for name, value in metadata.items():
             if type(value) is float:
                 fset.append(self.addFieldDouble(name, value))
             else:
                 fset.append(self.addField(name, value))
-        if len(usdData.children) > 0:
-            tokens = [c.name for c in usdData.children]
-            fset.append(self.addFieldTokenVector('primChildren', tokens))
-        fset = self.addFieldSet(fset)
+        if len(children) > 0:
+            fset.append(self.addFieldTokenVector('primChildren', children))
+        return self.addFieldSet(fset)
+
+    def writeUsd(self, usdData):
+        # The crate is built in memory and written to the file in one go
+        file = self.file
+        self.file = io.BytesIO()
+        try:
+            self.writeUsdData(usdData)
+            with self.file.getbuffer() as buffer:
+                file.write(buffer)
+        finally:
+            self.file = file
+
+    def writeUsdData(self, usdData):
+        usdData.updatePathIndices()
+        self.writeBootStrap()
+        # Add Root Metadata
+        fset = self.addPseudoRootFields(usdData.metadata, [c.name for c in usdData.children])
         usdData.pathIndex = self.addSpec(fset, SpecType.PseudoRoot)
         # Add First Path
         nameToken = self.getTokenIndex('')
-        pathJump = usdData.getPathJump()
+        pathJump = usdData.pathJump
         self.addPath(usdData.pathIndex, nameToken, pathJump, False)
         # Write the Children
         for child in usdData.children:
@@ -657,21 +1175,125 @@ class CrateFile:
         self.writeSections()
         self.writeTableOfContents()
 
+    def getPathIndex(self, pathStr):
+        # Indices are handed out on first use, by a spec or a target
+        if not pathStr in self.pathIndices:
+            self.pathIndices[pathStr] = len(self.pathIndices)
+        return self.pathIndices[pathStr]
+
+    def beginUsd(self, metadata = {}):
+        # Start a streamed file, prims are then added depth first with
+        # beginPrim, addAttribute and endPrim and written out by finish
+        self.pathIndices = {}
+        self.writeBootStrap()
+        self.rootMetadata = metadata
+        self.primStack = [PathNode('', self.getPathIndex(''), 0)]
+
+    def beginPrim(self, usdPrim):
+        parent = self.primStack[-1]
+        pathStr = parent.pathStr + '/' + usdPrim.name
+        node = PathNode(pathStr, self.getPathIndex(pathStr), 0)
+        node.fset = self.addPrimFields(usdPrim)
+        node.token = self.getTokenIndex(usdPrim.name)
+        usdPrim.pathIndex = node.pathIndex
+        parent.children.append((usdPrim.name, node))
+        self.primStack.append(node)
+
+    def addAttribute(self, usdAtt):
+        prim = self.primStack[-1]
+        fset, specType = self.addPropertyFields(usdAtt)
+        usdAtt.pathIndex = self.getPathIndex(prim.pathStr + '.' + usdAtt.name)
+        self.addSpec(fset, specType, usdAtt.pathIndex)
+        prim.properties.append((usdAtt.name, usdAtt.pathIndex, self.getTokenIndex(usdAtt.name)))
+
+    def endPrim(self):
+        node = self.primStack.pop()
+        fset = node.fset
+        if len(node.properties) > 0:
+            tokens = [name for name, pathIndex, token in node.properties]
+            fset.append(self.addFieldTokenVector('properties', tokens))
+        if len(node.children) > 0:
+            tokens = [name for name, child in node.children]
+            fset.append(self.addFieldTokenVector('primChildren', tokens))
+        self.addSpec(self.addFieldSet(fset), SpecType.Prim, node.pathIndex)
+        # Only the path tree entries are kept once a prim is done
+        node.fset = None
+
+    def writePrim(self, usdPrim):
+        # Stream a prim and its subtree in the order writeUsd uses
+        stack = [(usdPrim, False)]
+        while len(stack) > 0:
+            usdPrim, visited = stack.pop()
+            if visited:
+                for attribute in usdPrim.attributes:
+                    self.addAttribute(attribute)
+                self.endPrim()
+                continue
+            self.beginPrim(usdPrim)
+            stack.append((usdPrim, True))
+            stack += [(child, False) for child in reversed(usdPrim.children)]
+
+    def addStreamedPaths(self, root):
+        # Paths in the order and with the jumps writeUsd gives them, a prim
+        # is followed by its children and then by its properties
+        stack = [(root, None, False)]
+        while len(stack) > 0:
+            node, parent, visited = stack.pop()
+            if not visited:
+                node.position = len(self.paths)
+                self.addPath(node.pathIndex, node.token, 0, False)
+                stack.append((node, parent, True))
+                stack += ((child, node, False) for name, child in reversed(node.children))
+                continue
+            for name, pathIndex, token in node.properties:
+                self.addPath(pathIndex, token, 0, True)
+            if len(node.properties) > 0:
+                path, token, jump = self.paths[-1]
+                self.paths[-1] = (path, token, -2)
+            hasChild = len(node.children) > 0 or len(node.properties) > 0
+            hasSibling = parent != None and (parent.children[-1][1] is not node or len(parent.properties) > 0)
+            jump = encodePathJump(hasChild, hasSibling, len(self.paths) - node.position)
+            path, token, oldJump = self.paths[node.position]
+            self.paths[node.position] = (path, token, jump)
+
+    def finish(self):
+        root = self.primStack.pop()
+        if len(self.primStack) > 0:
+            print('Unfinished prims in streamed crate file:', len(self.primStack))
+        fset = self.addPseudoRootFields(self.rootMetadata, [name for name, child in root.children])
+        self.addSpec(fset, SpecType.PseudoRoot, root.pathIndex)
+        root.token = self.getTokenIndex('')
+        self.addStreamedPaths(root)
+        if len(self.paths) < len(self.pathIndices):
+            print('Unresolved paths in streamed crate file:', len(self.pathIndices) - len(self.paths))
+        self.writeSections()
+        self.writeTableOfContents()
+        self.pathIndices = None
+        self.primStack = []
+
+    def getFieldSetValue(self, fset, fieldName):
+        for field in self.getFieldSet(fset):
+            if field < len(self.reps) and self.getTokenStr(self.fields[field]) == fieldName:
+                return self.getRepValue(self.reps[field])
+        return None
+
     def getFieldSetMetadata(self, fset):
         metadata = {}
         fset = self.getFieldSet(fset)
         for field in fset:
             if field < len(self.reps):
                 name = self.getTokenStr(self.fields[field])
-                value = self.getRepValue(self.reps[field])
-                metadata[name] = value
+                if name in self.skipFields:
+                    continue
+                rep = self.reps[field]
+                if self.lazy and name in LAZY_FIELDS and isLazyRep(rep):
+                    metadata[name] = LazyValue(partial(self.getRepValue, rep), self.memoize)
+                else:
+                    metadata[name] = self.getRepValue(rep)
         return metadata
 
 
-    def readUsdItem(self, parent = None, index = 0):
-        path, token, jump = self.paths[index]
-        if not path in self.specsMap:
-            return (index + 1, -1)
+    def createUsdItem(self, parent, path, token):
         fset, spec = self.specsMap[path]
         specType = SpecType(spec)
         metadata = self.getFieldSetMetadata(fset)
@@ -695,12 +1317,8 @@ class CrateFile:
                 metadata.pop('primChildren')
             prim.metadata = metadata
             prim.pathIndex = path
-            index += 1
-            itemJump = jump
-            while index < len(self.paths) and itemJump != -2:
-                index, itemJump = self.readUsdItem(prim, index)
-            jump = -2 if jump == -1 else -1
-            return (index, jump)
+            self.pathItems[path] = prim
+            return prim
         elif specType == SpecType.Attribute:
             valueTypeStr = metadata.pop('typeName').replace('[]', '')
             valueType = getValueTypeFromStr(valueTypeStr)
@@ -709,6 +1327,7 @@ class CrateFile:
                 value = value.replace('@', '')
             att = parent.createAttribute(name, value, valueType)
             att.pathIndex = path
+            self.pathItems[path] = att
             if att.valueType.name != valueTypeStr:
                 att.valueTypeStr = valueTypeStr
             if 'variability' in metadata and metadata.pop('variability') == 1:
@@ -718,31 +1337,221 @@ class CrateFile:
             if 'timeSamples' in metadata:
                 att.frames = metadata.pop('timeSamples')
             att.metadata = metadata
+            return att
         elif specType == SpecType.Relationship:
             rel = parent.createAttribute(name)
             rel.pathIndex = path
+            self.pathItems[path] = rel
             rel.valueTypeStr = 'rel'
             if 'variability' in metadata and metadata.pop('variability') == 1:
                 rel.addQualifier('uniform')
             if 'custom' in metadata and metadata.pop('custom') == 1:
                 rel.addQualifier('custom')
             rel.metadata = metadata
-        return (index + 1, jump)
-
-    def readUsd(self):
+            return rel
+        return None
+
+    def getSpecField(self, path, fieldName):
+        # Decodes a single field of the spec at a path index
+        if path in self.specsMap:
+            fset, spec = self.specsMap[path]
+            return self.getFieldSetValue(fset, fieldName)
+        return None
+
+    def selectPaths(self, include = None, exclude = None):
+        # Path entries to read, prims only included as ancestors of
+        # included paths are read without their properties
+        incPaths, incClasses, incNames = splitPathRules(include)
+        excPaths, excClasses, excNames = splitPathRules(exclude)
+        primRules = len(incPaths) > 0 or len(incClasses) > 0
+        numPaths = len(self.paths)
+        selected = bytearray(numPaths)
+        inside = bytearray(numPaths)
+        if numPaths > 0:
+            selected[0] = 1
+            inside[0] = not primRules
+        for index in range(1, numPaths):
+            parent = self.pathParents[index]
+            if not selected[parent]:
+                continue
+            pathStr = self.pathStrings[index]
+            if self.pathPrims[index]:
+                typeName = None
+                if len(incClasses) > 0 or len(excClasses) > 0:
+                    typeName = self.getSpecField(self.paths[index][0], 'typeName')
+                if matchPathPrefix(pathStr, excPaths) or typeName in excClasses:
+                    continue
+                if inside[parent] or matchPathPrefix(pathStr, incPaths) or typeName in incClasses:
+                    inside[index] = 1
+                selected[index] = 1
+            else:
+                name = self.getTokenStr(self.pathTokens[index])
+                if not inside[parent] and not matchPathPrefix(pathStr, incPaths):
+                    continue
+                if matchPathPrefix(pathStr, excPaths) or matchPropertyName(name, excNames):
+                    continue
+                if len(incNames) > 0 and not matchPropertyName(name, incNames):
+                    continue
+                selected[index] = 1
+        # Drop prims outside the included paths that have nothing included below
+        used = bytearray(numPaths)
+        for index in range(numPaths - 1, 0, -1):
+            if selected[index] and (inside[index] or used[index] or not self.pathPrims[index]):
+                used[self.pathParents[index]] = 1
+            else:
+                selected[index] = 0
+        return selected
+
+    def readUsd(self, lazy = True, memoize = True, tuples = False,
+                include = None, exclude = None, metadataOnly = False):
+        # Files are mapped in memory and parsed without further reads, when
+        # lazy the mapping stays open for the values decoded on first use.
+        # Arrays are typed arrays over the file unless tuples is set.
+        # Include and exclude take path prefixes, prim ClassTypes and
+        # property name patterns, excluded specs are never decoded
+        self.lazy = lazy
+        self.memoize = memoize
+        self.tuples = tuples
+        self.skipFields = LAZY_FIELDS if metadataOnly else ()
+        file = self.file
+        if not isinstance(file, CrateBuffer):
+            self.file = mapCrateFile(file)
+        try:
+            return self.readUsdData(include, exclude)
+        finally:
+            if self.file is not file and not lazy:
+                self.file.close()
+                self.file = file
+
+    def close(self):
+        # Releases the mapping kept open by a lazy read or a query, lazy
+        # values that were not decoded yet can no longer be read
+        if isinstance(self.file, CrateBuffer):
+            self.file.close()
+
+    def readUsdData(self, include = None, exclude = None):
         self.readTableOfContents()
         path, token, jump = self.paths[0]
         fset, spec = self.specsMap[path]
+        selected = None
+        if include != None or exclude != None:
+            selected = self.selectPaths(include, exclude)
         data = UsdData()
         data.metadata = self.getFieldSetMetadata(fset)
         if 'primChildren' in data.metadata:
             data.metadata.pop('primChildren')
-        index = 1
-        while index < len(self.paths):
-            index, jump = self.readUsdItem(data, index)
-        data.resolvePaths()
+        self.pathItems = {}
+        # Paths are in tree order so parents are created before children,
+        # paths without a spec are skipped along with their descendants
+        items = [None] * len(self.paths)
+        items[0] = data
+        for index in range(1, len(self.paths)):
+            parent = items[self.pathParents[index]]
+            path, token, jump = self.paths[index]
+            if selected != None and not selected[index]:
+                continue
+            if parent != None and path in self.specsMap:
+                items[index] = self.createUsdItem(parent, path, token)
+        data.resolvePaths(self.pathItems)
         return data
 
+    def getQueryIndexKey(self):
+        # Digest of the sections the path to spec index is built from
+        digest = hashlib.md5()
+        for name in ('TOKENS', 'PATHS', 'SPECS'):
+            start, size = self.getTableItem(name)
+            self.file.seek(start)
+            digest.update(self.file.read(size))
+        return '%d-%s' % (self.file.size, digest.hexdigest())
+
+    def buildQueryIndex(self):
+        # Path strings with their path index, field set, spec type and
+        # parent entry in path table order
+        self.readPathsSection()
+        self.readSpecsSection()
+        specs = [self.specsMap.get(path, (-1, 0)) for path, token, jump in self.paths]
+        return {'paths': self.pathStrings,
+                'indices': [path for path, token, jump in self.paths],
+                'fsets': [fset for fset, spec in specs],
+                'specs': [spec for fset, spec in specs],
+                'parents': self.pathParents.tolist()}
+
+    def readQueryIndex(self, indexPath, key):
+        try:
+            with open(indexPath, 'r') as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if index.get('version') != QUERY_INDEX_VERSION or index.get('key') != key:
+            return None
+        return index
+
+    def writeQueryIndex(self, indexPath, index):
+        try:
+            with open(indexPath, 'w') as file:
+                json.dump(index, file, separators=(',', ':'))
+        except OSError as e:
+            print('Unable to write query index:', indexPath, e)
+
+    def loadQueryIndex(self, indexPath = None):
+        # Reads the tables needed to decode fields and the path to spec
+        # index, from the sidecar index file when it matches the crate
+        if not isinstance(self.file, CrateBuffer):
+            self.file = mapCrateFile(self.file)
+        self.lazy = False
+        self.skipFields = ()
+        self.readTableOfContents(pathTables = False)
+        index = None
+        if indexPath != None:
+            key = self.getQueryIndexKey()
+            index = self.readQueryIndex(indexPath, key)
+        if index == None:
+            index = self.buildQueryIndex()
+            if indexPath != None:
+                index.update({'version': QUERY_INDEX_VERSION, 'key': key})
+                self.writeQueryIndex(indexPath, index)
+        paths = index['paths']
+        self.queryPaths = dict(zip(paths, zip(index['indices'], index['fsets'], index['specs'])))
+        self.queryPathStrs = dict(zip(index['indices'], paths))
+        self.queryPathList = paths
+        self.queryParents = index['parents']
+        self.queryChildren = None
+
+    def get(self, pathStr, fieldName = None):
+        # Decodes an attribute value, relationship target or prim metadata
+        # straight from the crate tables, or a single field of any spec
+        if self.queryPaths == None:
+            self.loadQueryIndex()
+        if not pathStr in self.queryPaths:
+            return None
+        path, fset, spec = self.queryPaths[pathStr]
+        if fset < 0:
+            return None
+        if fieldName != None:
+            return self.getFieldSetValue(fset, fieldName)
+        if spec == SpecType.Prim.value or spec == SpecType.PseudoRoot.value:
+            return self.getFieldSetMetadata(fset)
+        for fieldName in ('default', 'timeSamples', 'targetChildren', 'connectionChildren'):
+            value = self.getFieldSetValue(fset, fieldName)
+            if value is not None:
+                if fieldName in ('targetChildren', 'connectionChildren'):
+                    return self.queryPathStrs.get(value)
+                return value
+        return None
+
+    def listChildren(self, pathStr, properties = False):
+        # Paths of the child prims of a prim, or of its properties
+        if self.queryPaths == None:
+            self.loadQueryIndex()
+        if self.queryChildren == None:
+            self.queryChildren = {}
+            paths = self.queryPathList
+            for child, parent in zip(paths, self.queryParents):
+                if parent >= 0:
+                    self.queryChildren.setdefault(paths[parent], []).append(child)
+        children = self.queryChildren.get(pathStr, [])
+        return [p for p in children if ('.' in p.rsplit('/', 1)[-1]) == properties]
+
     def getTableItem(self, sectionName):
         for name, start, size in self.toc:
             if sectionName == name:
@@ -751,18 +1560,18 @@ class CrateFile:
 
     def seekTableOfContents(self):
         self.file.seek(9)
-        self.version = readInt(self.file, 1)
+        self.version = self.file.readInt(1)
         self.file.seek(16)
-        tocStart = readInt(self.file, 8)
+        tocStart = self.file.readInt(8)
         self.file.seek(tocStart)
 
     def readTokensSection(self):
         start, size = self.getTableItem('TOKENS')
         if start > 0 and size > 0:
             self.file.seek(start+8)
-            compressedSize = readInt(self.file, 8)
-            buffer = bytearray(self.file.read(compressedSize))
-            buffer = lz4Decompress(buffer)
+            uncompressedSize = self.file.readInt(8)
+            compressedSize = self.file.readInt(8)
+            buffer = self.decompress(self.file.read(compressedSize), uncompressedSize)
             self.tokens = buffer.decode('utf-8').split('\0')
             #print(self.tokens)
             self.tokenMap = {}
@@ -775,73 +1584,119 @@ class CrateFile:
         start, size = self.getTableItem('STRINGS')
         if start > 0 and size > 0:
             self.file.seek(start)
-            numStrings = readInt(self.file, 8)
-            self.strings = [readInt(self.file, 4) for i in range(numStrings)]
+            numStrings = self.file.readInt(8)
+            self.strings = decodeInts(self.file.read(numStrings * 4), numStrings, 4)
 
     def readFieldsSection(self):
         start, size = self.getTableItem('FIELDS')
         if start > 0 and size > 0:
             self.file.seek(start)
-            numFields = readInt(self.file, 8)
-            self.fields = readInt32Compressed(self.file, numFields)
+            numFields = self.file.readInt(8)
+            self.fields = self.readInt32Compressed(numFields)
             #print(self.fields)
-            size = readInt(self.file, 8)
-            buffer = lz4Decompress(self.file.read(size))
-            self.reps = decodeInts(buffer, numFields, 8)
+            size = self.file.readInt(8)
+            buffer = self.decompress(self.file.read(size), numFields * 8)
+            self.reps = decodeInts(buffer, numFields, 8, view=True)
             #print(self.reps)
 
     def readFieldSetsSection(self):
         start, size = self.getTableItem('FIELDSETS')
         if start > 0 and size > 0:
             self.file.seek(start)
-            numSets = readInt(self.file, 8)
-            self.fsets = readInt32Compressed(self.file, numSets)
+            numSets = self.file.readInt(8)
+            self.fsets = self.readInt32Compressed(numSets)
             #print(self.fsets)
 
     def readPathsSection(self):
         start, size = self.getTableItem('PATHS')
         if start > 0 and size > 0:
             self.file.seek(start)
-            numPaths = readInt(self.file, 8)
-            numPaths = readInt(self.file, 8)
-            paths = readInt32Compressed(self.file, numPaths)
-            tokens = readInt32Compressed(self.file, numPaths)
-            jumps = readInt32Compressed(self.file, numPaths)
+            numPaths = self.file.readInt(8)
+            numPaths = self.file.readInt(8)
+            paths = self.readInt32Compressed(numPaths)
+            tokens = self.readInt32Compressed(numPaths)
+            jumps = self.readInt32Compressed(numPaths)
             self.paths = []
             for i in range(0, numPaths):
                 self.paths.append((paths[i], tokens[i], jumps[i]))
             #print(self.paths)
+        self.decodePaths()
+
+    def decodePaths(self):
+        # Flatten the path tree into parent entries, name tokens, prim flags
+        # and path strings with an explicit stack of sibling entries
+        numPaths = len(self.paths)
+        self.pathParents = array('i', [-1]) * numPaths
+        self.pathTokens = array('i', [0]) * numPaths
+        self.pathPrims = bytearray(numPaths)
+        self.pathStrings = [''] * numPaths
+        self.pathEntries = {}
+        stack = [(0, -1)] if numPaths > 0 else []
+        while len(stack) > 0:
+            index, parent = stack.pop()
+            while index < numPaths:
+                path, token, jump = self.paths[index]
+                self.pathParents[index] = parent
+                self.pathTokens[index] = abs(token)
+                self.pathPrims[index] = token >= 0
+                self.pathEntries[path] = index
+                if parent < 0:
+                    self.pathStrings[index] = '/'
+                elif token < 0:
+                    self.pathStrings[index] = self.pathStrings[parent] + '.' + self.getTokenStr(token)
+                else:
+                    self.pathStrings[index] = self.pathStrings[parent].rstrip('/') + '/' + self.getTokenStr(token)
+                hasChild = jump > 0 or jump == -1
+                hasSibling = jump >= 0
+                if hasChild and hasSibling:
+                    stack.append((index + jump, parent))
+                if hasChild:
+                    parent = index
+                elif not hasSibling:
+                    break
+                index += 1
+
+    def getPathEntries(self, prefix = '/', primsOnly = False):
+        # Entries of the path and every path below it
+        prefix = prefix.rstrip('/')
+        entries = []
+        for index, pathStr in enumerate(self.pathStrings):
+            if pathStr == prefix or pathStr.startswith(prefix + '/') or pathStr.startswith(prefix + '.') or prefix == '':
+                if self.pathPrims[index] or not primsOnly:
+                    entries.append(index)
+        return entries
 
     def readSpecsSection(self):
         start, size = self.getTableItem('SPECS')
         if start > 0 and size > 0:
             self.file.seek(start)
-            numSpecs = readInt(self.file, 8)
-            paths = readInt32Compressed(self.file, numSpecs)
-            fsets = readInt32Compressed(self.file, numSpecs)
-            types = readInt32Compressed(self.file, numSpecs)
+            numSpecs = self.file.readInt(8)
+            paths = self.readInt32Compressed(numSpecs)
+            fsets = self.readInt32Compressed(numSpecs)
+            types = self.readInt32Compressed(numSpecs)
             self.specs = []
             for i in range(0, numSpecs):
                 self.specs.append((paths[i], fsets[i], types[i]))
                 self.specsMap[paths[i]] = (fsets[i], types[i])
             #print(self.specs)
 
-    def readTableOfContents(self):
+    def readTableOfContents(self, pathTables = True):
         self.toc = []
         self.seekTableOfContents()
-        numItems = readInt(self.file, 8)
+        numItems = self.file.readInt(8)
         for i in range(0, numItems):
-            name = self.file.read(16).decode('utf-8').rstrip('\0')
-            start = readInt(self.file, 8)
-            size = readInt(self.file, 8)
+            name = bytes(self.file.read(16)).decode('utf-8').rstrip('\0')
+            start = self.file.readInt(8)
+            size = self.file.readInt(8)
             self.toc.append((name, start, size))
         # Read Each Section
         self.readTokensSection()
         self.readStringsSection()
         self.readFieldsSection()
         self.readFieldSetsSection()
-        self.readPathsSection()
-        self.readSpecsSection()
+        if pathTables:
+            self.readPathsSection()
+            self.readSpecsSection()
 
     def getFieldSet(self, index):
         fset = []
@@ -861,45 +1716,89 @@ class CrateFile:
             return self.getTokenStr(self.strings[index])
         return ''
 
-    def readFloatVector(self, size):
-        buffer = self.file.read(4*size)
-        if len(buffer) < 4*size:
+    def readVector(self, size, packType = 'f'):
+        if self.file.tell() + struct.calcsize(packType)*size > self.file.size:
+            self.file.seek(0, 2)
             return (0.0,)*size
-        return struct.unpack('<%df'%size, buffer)
-        #return struct.unpack('<%df'%size, self.file.read(4*size))
+        return self.file.unpack('<%d%s'%(size, packType))
+
+    def readFloatVector(self, size):
+        return self.readVector(size, 'f')
 
     def readDoubleVector(self, size):
-        buffer = self.file.read(8*size)
-        if len(buffer) < 8*size:
-            return (0.0,)*size
-        return struct.unpack('<%dd'%size, buffer)
-        #return struct.unpack('<%dd'%size, self.file.read(8*size))
+        return self.readVector(size, 'd')
 
     def readMatrix(self, size):
         return tuple(self.readDoubleVector(size) for i in range(size))
 
+    def readArray(self, count, packType, shape = ()):
+        # NumPy arrays shaped like the values are views over the file, the
+        # array module only holds flat values so it is used for scalars
+        size = 1
+        for n in shape:
+            size *= n
+        numBytes = struct.calcsize(packType) * size * count
+        if self.file.tell() + numBytes > self.file.size:
+            return self.readTupleArray(count, packType, shape)
+        if np != None and not self.tuples:
+            data = self.file.read(numBytes)
+            return np.frombuffer(data, NUMPY_DTYPES[packType]).reshape((count,) + shape)
+        if self.tuples or len(shape) > 0 or packType == 'e':
+            return self.readTupleArray(count, packType, shape)
+        values = array(packType)
+        values.frombytes(self.file.read(numBytes))
+        if sys.byteorder != 'little':
+            values.byteswap()
+        return values
+
+    def readTupleArray(self, count, packType, shape = ()):
+        if len(shape) == 0:
+            if self.file.tell() + struct.calcsize(packType) * count > self.file.size:
+                return [self.readVector(1, packType)[0] for i in range(count)]
+            return list(self.file.unpack('<%d%s' % (count, packType)))
+        size = shape[-1]
+        rows = count * (shape[0] if len(shape) > 1 else 1)
+        if self.file.tell() + struct.calcsize(packType) * size * rows > self.file.size:
+            values = [self.readVector(size, packType) for i in range(rows)]
+        else:
+            values = self.file.unpack('<%d%s' % (rows * size, packType))
+            values = [values[i:i + size] for i in range(0, len(values), size)]
+        if len(shape) > 1:
+            return [tuple(values[i:i + size]) for i in range(0, len(values), size)]
+        return values
+
+    def makeArray(self, values, packType):
+        # Typed array of values decoded from a compressed array
+        if self.tuples:
+            return values
+        if np != None:
+            return np.array(values, NUMPY_DTYPES[packType])
+        if packType == 'e':
+            return values
+        return array(packType, values)
+
     def readDictionary(self, loc):
         self.file.seek(loc)
-        numItems = readInt(self.file, 8)
+        numItems = self.file.readInt(8)
         dic = {}
         for i in range(numItems):
-            key = self.getStringStr(readInt(self.file, 4))
-            itemSize = readInt(self.file, 8)
+            key = self.getStringStr(self.file.readInt(4))
+            itemSize = self.file.readInt(8)
             loc = self.file.tell()
             if itemSize > 4:
                 self.file.seek(loc + itemSize - 4)
-                vt = ValueType((readInt(self.file, 4) >> 16) & 0xFF)
+                vt = ValueType((self.file.readInt(4) >> 16) & 0xFF)
                 self.file.seek(loc)
                 if vt == ValueType.Dictionary:
                     dic[key] = self.readDictionary(loc)
                 elif vt == ValueType.string:
-                    dic[key] = self.getStringStr(readInt(self.file, 4))
+                    dic[key] = self.getStringStr(self.file.readInt(4))
                 elif vt == ValueType.bool:
-                    dic[key] = readInt(self.file, 4) > 0
+                    dic[key] = self.file.readInt(4) > 0
                 elif vt == ValueType.float:
-                    dic[key] = struct.unpack('<f', self.file.read(4))[0]
+                    dic[key] = self.file.unpack('<f')[0]
                 elif vt == ValueType.double:
-                    dic[key] = struct.unpack('<d', self.file.read(8))[0]
+                    dic[key] = self.file.unpack('<d')[0]
                 #else:
                 #    print('Unhandled Dictionary Type:', vt.name)
             self.file.seek(loc + itemSize)
@@ -908,27 +1807,16 @@ class CrateFile:
     def decodeInlineFloatVector(payload, size):
         data = rep['payload'].to_bytes(4*size, byteorder='big')
 
-    def decodeRepFloatVector(self, rep, size):
+    def decodeRepVector(self, rep, size, packType = 'f'):
         if rep['inline']:
             data = rep['payload'].to_bytes(8, byteorder='little')
             return tuple(float(data[i]) for i in range(size))
         self.file.seek(rep['payload'])
         if rep['array']:
             countBytes = 4 if self.version < 7 else 8
-            count = readInt(self.file, countBytes)
-            return [self.readFloatVector(size) for i in range(count)]
-        return self.readFloatVector(size)
-
-    def decodeRepDoubleVector(self, rep, size):
-        if rep['inline']:
-            data = rep['payload'].to_bytes(8, byteorder='little')
-            return tuple(float(data[i]) for i in range(size))
-        self.file.seek(rep['payload'])
-        if rep['array']:
-            countBytes = 4 if self.version < 7 else 8
-            count = readInt(self.file, countBytes)
-            return [self.readDoubleVector(size) for i in range(count)]
-        return self.readDoubleVector(size)
+            count = self.file.readInt(countBytes)
+            return self.readArray(count, packType, (size,))
+        return self.readVector(size, packType)
 
     def decodeRepMatrix(self, rep, size):
         if rep['inline']:
@@ -936,32 +1824,45 @@ class CrateFile:
         self.file.seek(rep['payload'])
         if rep['array']:
             countBytes = 4 if self.version < 7 else 8
-            count = readInt(self.file, countBytes)
-            return [self.readMatrix(size) for i in range(count)]
+            count = self.file.readInt(countBytes)
+            return self.readArray(count, 'd', (size, size))
         return self.readMatrix(size)
 
+    def readCompressedFloatArray(self, count, packType = 'f'):
+        code = self.file.read(1)
+        if code == b'i':
+            return self.makeArray([float(i) for i in self.readInt32Compressed(count)], packType)
+        if code == b't':
+            size = self.file.readInt(4)
+            table = self.file.unpack('<%d%s' % (size, packType))
+            return self.makeArray([table[i] for i in self.readInt32Compressed(count)], packType)
+        print('UnHandled compressed array code:', code)
+        return []
+
+    def readTokenVector(self, count):
+        numTokens = len(self.tokens)
+        return [self.tokens[t] for t in self.file.unpack('<%dI'%count) if t < numTokens]
+
     def readTimeFrames(self, ref):
         self.file.seek(ref)
-        self.file.seek(ref + readInt(self.file, 8))
-        ref = readInt(self.file, 6) - 8
-        vType = ValueType(readInt(self.file, 1))
+        self.file.seek(ref + self.file.readInt(8))
+        ref = self.file.readInt(6) - 8
+        vType = ValueType(self.file.readInt(1))
         self.file.seek(ref + 8)
         if vType == ValueType.DoubleVector:
-            return self.readDoubleVector(readInt(self.file, 8))
+            return self.readDoubleVector(self.file.readInt(8))
         print('UnHandled frames value type:', vType.name)
         return []
 
     def readSampleReps(self, ref):
         self.file.seek(ref)
-        self.file.seek(ref + readInt(self.file, 8) + 8)
-        count = readInt(self.file, readInt(self.file, 8))
+        self.file.seek(ref + self.file.readInt(8) + 8)
+        count = self.file.readInt(self.file.readInt(8))
         reps = []
-        for i in range(count):
-            # Read the refrence and value type
-            payload = readInt(self.file, 6)
-            vType = readInt(self.file, 1)
-            rep = (payload & PAYLOAD_MASK) | (vType << 48)
-            elem = readInt(self.file, 1)
+        # Each value is a 6 byte refrence, a type byte and an element byte
+        for rep in decodeInts(self.file.read(count * 8), count, 8):
+            elem = rep >> 56
+            rep &= PAYLOAD_MASK | (0xFF << 48)
             if elem > 0:
                 if elem == 64:
                     rep |= INLINE_BIT
@@ -981,47 +1882,35 @@ class CrateFile:
             if not rep['inline']:
                 self.file.seek(rep['payload'])
                 numBytes = 4 if self.version < 7 else 8
-                numTokens = readInt(self.file, numBytes)
-                tokens = []
-                for i in range(numTokens):
-                    token = readInt(self.file, 4)
-                    if (token < len(self.tokens)):
-                        tokens.append(self.tokens[token])
-                return tokens
+                return self.readTokenVector(self.file.readInt(numBytes))
             elif rep['payload'] < len(self.tokens):
                 return self.tokens[rep['payload']]
         elif rep['type'] == ValueType.asset:
             return '@' + self.tokens[rep['payload']] + '@'
         elif rep['type'] == ValueType.TokenVector:
             self.file.seek(rep['payload'])
-            numTokens = readInt(self.file, 8)
-            tokens = []
-            for i in range(numTokens):
-                token = readInt(self.file, 4)
-                if (token < len(self.tokens)):
-                    tokens.append(self.tokens[token])
-            return tokens
+            return self.readTokenVector(self.file.readInt(8))
         elif rep['type'] == ValueType.PathListOp:
             self.file.seek(rep['payload'])
             listOp = {}
-            listOp['op'] = readInt(self.file, 8)
+            listOp['op'] = self.file.readInt(8)
             self.file.seek(self.file.tell()+1)
-            listOp['path'] = readInt(self.file, 4)
+            listOp['path'] = self.file.readInt(4)
             return listOp
         elif rep['type'] == ValueType.Variability or rep['type'] == ValueType.bool:
             #print('Boolean:', rep)
             return True if rep['payload'] > 0 else False
         elif rep['type'] == ValueType.PathVector:
             self.file.seek(rep['payload'])
-            numPaths = readInt(self.file, 8)
-            path = readInt(self.file, 4)
+            numPaths = self.file.readInt(8)
+            path = self.file.readInt(4)
             #print('numPaths', numPaths, 'path', path)
             return path
         elif rep['type'] == ValueType.ReferenceListOp:
             self.file.seek(rep['payload'] + 1)
-            numRefs = readInt(self.file, 8)
-            strIndex = readInt(self.file, 4)
-            pathIndex = readInt(self.file, 8)
+            numRefs = self.file.readInt(8)
+            strIndex = self.file.readInt(4)
+            pathIndex = self.file.readInt(8)
             return pathIndex
         elif rep['type'] == ValueType.int:
             if rep['inline']:
@@ -1029,41 +1918,62 @@ class CrateFile:
             self.file.seek(rep['payload'])
             if rep['array']:
                 countBytes = 4 if self.version < 7 else 8
-                count = readInt(self.file, countBytes)
-                if rep['compressed']:
-                    return readInt32Compressed(self.file, count)
-                return [readInt(self.file, 4, signed=True) for i in range(count)]
-            return readInt(self.file, 4, signed=True)
+                count = self.file.readInt(countBytes)
+                if isCompressedArray(rep, count):
+                    return self.makeArray(self.readInt32Compressed(count), 'i')
+                return self.readArray(count, 'i')
+            return self.file.readInt(4, True)
         elif rep['type'] == ValueType.float:
             if rep['inline']:
                 return struct.unpack('<f', rep['payload'].to_bytes(4, byteorder='little'))[0]
             self.file.seek(rep['payload'])
             if rep['array']:
                 countBytes = 4 if self.version < 7 else 8
-                count = readInt(self.file, countBytes)
-                return list(struct.unpack('<%df'%count, self.file.read(4*count)))
-            return struct.unpack('<f', self.file.read(4))
+                count = self.file.readInt(countBytes)
+                if isCompressedArray(rep, count):
+                    return self.readCompressedFloatArray(count, 'f')
+                return self.readArray(count, 'f')
+            return self.file.unpack('<f')
         elif rep['type'] == ValueType.double:
             if rep['inline']:
                 return struct.unpack('<f', rep['payload'].to_bytes(4, byteorder='little'))[0]
             self.file.seek(rep['payload'])
             if rep['array']:
                 countBytes = 4 if self.version < 7 else 8
-                count = readInt(self.file, countBytes)
-                return list(struct.unpack('<%dd'%count, self.file.read(8*count)))
-            return struct.unpack('<d', self.file.read(8))
+                count = self.file.readInt(countBytes)
+                if isCompressedArray(rep, count):
+                    return self.readCompressedFloatArray(count, 'd')
+                return self.readArray(count, 'd')
+            return self.file.unpack('<d')
+        elif rep['type'] == ValueType.half:
+            if rep['inline']:
+                return struct.unpack('<e', (rep['payload'] & 0xFFFF).to_bytes(2, byteorder='little'))[0]
+            self.file.seek(rep['payload'])
+            if rep['array']:
+                countBytes = 4 if self.version < 7 else 8
+                count = self.file.readInt(countBytes)
+                if isCompressedArray(rep, count):
+                    return self.readCompressedFloatArray(count, 'e')
+                return self.readArray(count, 'e')
+            return self.file.unpack('<e')[0]
+        elif rep['type'] == ValueType.vec2h:
+            return self.decodeRepVector(rep, 2, 'e')
+        elif rep['type'] == ValueType.vec3h:
+            return self.decodeRepVector(rep, 3, 'e')
+        elif rep['type'] in (ValueType.vec4h, ValueType.quath):
+            return self.decodeRepVector(rep, 4, 'e')
         elif rep['type'] == ValueType.vec2f:
-            return self.decodeRepFloatVector(rep, 2)
+            return self.decodeRepVector(rep, 2, 'f')
         elif rep['type'] == ValueType.vec3f:
-            return self.decodeRepFloatVector(rep, 3)
+            return self.decodeRepVector(rep, 3, 'f')
         elif rep['type'] in (ValueType.vec4f, ValueType.quatf):
-            return self.decodeRepFloatVector(rep, 4)
+            return self.decodeRepVector(rep, 4, 'f')
         elif rep['type'] == ValueType.vec2d:
-            return self.decodeRepDoubleVector(rep, 2)
+            return self.decodeRepVector(rep, 2, 'd')
         elif rep['type'] == ValueType.vec3d:
-            return self.decodeRepDoubleVector(rep, 3)
+            return self.decodeRepVector(rep, 3, 'd')
         elif rep['type'] in (ValueType.vec4d, ValueType.quatd):
-            return self.decodeRepDoubleVector(rep, 4)
+            return self.decodeRepVector(rep, 4, 'd')
         elif rep['type'] == ValueType.matrix2d:
             return self.decodeRepMatrix(rep, 2)
         elif rep['type'] == ValueType.matrix3d:
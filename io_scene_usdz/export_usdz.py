@@ -18,17 +18,22 @@ from io_scene_usdz.crate_file import *
 def export_usdz(context, filepath = '', exportMaterials = True,
                 bakeTextures = False, bakeTextureSize = 1024, bakeAO = False,
                 bakeAOSamples = 64, exportAnimations = False,
-                globalScale = 1.0, useConverter = False,
-                ):
+                globalScale = 1.0, compressionLevel = 0, useConverter = False,
+                printStats = False):
     exportDir, fileName = os.path.split(filepath)
     fileParts = fileName.split('.')
     fileName = fileParts[0] if len(fileParts) > 0 else 'file'
     fileType = fileParts[1] if len(fileParts) > 1 else 'usdz'
     filePath = exportDir + '/' + fileName + '.' + fileType
     tempDir = None
+    crateFilePath = None
     if not fileType in ('usda', 'usdc'):
         tempDir = tempfile.mkdtemp()
         exportDir = tempDir
+    if fileType == 'usdc':
+        crateFilePath = filePath
+    elif fileType != 'usda' and not useConverter:
+        crateFilePath = tempDir + '/' + fileName + '.usdc'
     usdData, texturePaths = exportUsdData(context = context,
                                           exportMaterials = exportMaterials,
                                           exportDir = exportDir,
@@ -37,22 +42,22 @@ def export_usdz(context, filepath = '', exportMaterials = True,
                                           bakeAO = bakeAO,
                                           bakeAOSamples = bakeAOSamples,
                                           exportAnimations = exportAnimations,
-                                          globalScale = globalScale)
+                                          globalScale = globalScale,
+                                          crateFilePath = crateFilePath,
+                                          compressionLevel = compressionLevel,
+                                          printStats = printStats)
+    # Crate files are streamed out during the export
     if fileType == 'usda':
         usdData.writeUsda(filePath)
-    elif fileType == 'usdc':
-        writeCrateFile(filePath, usdData)
-    else:
+    elif fileType != 'usdc':
         if useConverter:
             # Crate text usda file and run the USDZ Converter Tool
             usdaPath = tempDir + '/' + fileName + '.usda'
             usdData.writeUsda(usdaPath)
             convertToUsdz(filePath, usdaPath)
         else:
-            # Create Binary and Manually zip to a usdz file
-            usdcPath = tempDir + '/' + fileName + '.usdc'
-            writeCrateFile(usdcPath, usdData)
-            writeUsdzFile(filePath, usdcPath, texturePaths)
+            # Manually zip the streamed binary file to a usdz file
+            writeUsdzFile(filePath, crateFilePath, texturePaths)
     if tempDir != None:
         # Cleanup the Temp Directory
         shutil.rmtree(tempDir)
@@ -61,7 +66,8 @@ def export_usdz(context, filepath = '', exportMaterials = True,
 
 def exportUsdData(context, exportMaterials, exportDir, bakeTextures,
                   bakeTextureSize, bakeAO, bakeAOSamples, exportAnimations,
-                  globalScale):
+                  globalScale, crateFilePath = None, compressionLevel = 0,
+                  printStats = False):
     scene = Scene()
     scene.exportMaterials = exportMaterials
     scene.exportPath = exportDir
@@ -76,7 +82,24 @@ def exportUsdData(context, exportMaterials, exportDir, bakeTextures,
     if scene.bakeTextures:
         scene.exportBakedTextures()
     # Export the USD Data
-    usdData = scene.exportUsd()
+    usdData = None
+    if crateFilePath != None:
+        # Stream prims to the crate file as they are exported
+        try:
+            with open(crateFilePath, 'wb') as crateFile:
+                crate = CrateFile(crateFile, compressionLevel)
+                scene.exportCrate(crate)
+        except:
+            # Don't leave a partial crate file behind
+            if os.path.exists(crateFilePath):
+                os.remove(crateFilePath)
+            raise
+        if printStats:
+            crate.printCompressionStats()
+            crate.dataIndex.printStats()
+            crate.printSectionTimes()
+    else:
+        usdData = scene.exportUsd()
     texturePaths = scene.textureFilePaths
     # Cleanup the scene
     scene.cleanup()
@@ -97,9 +120,9 @@ def writeUsdzFile(filePath, usdcPath, texturePaths):
     usdz.close()
 
 
-def writeCrateFile(filePath, usdData):
+def writeCrateFile(filePath, usdData, compressionLevel = 0):
     crateFile = open(filePath, 'wb')
-    crate = CrateFile(crateFile)
+    crate = CrateFile(crateFile, compressionLevel)
     crate.writeUsd(usdData)
     crateFile.close()
 
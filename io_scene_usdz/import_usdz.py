@@ -31,7 +31,8 @@ def import_usdz(context, filepath = '', materials = True, animations = True):
             if usdcFile != '':
                 file = open(usdcFile, 'rb')
                 crate = CrateFile(file)
-                usdData = crate.readUsd()
+                usdData = crate.readUsd(lazy = False, tuples = True)
+                crate.close()
                 file.close()
                 print(usdData.toString(debug = True))
                 tempDir = usdcFile[:usdcFile.rfind('/')+1]
@@ -45,7 +46,8 @@ def import_usdz(context, filepath = '', materials = True, animations = True):
         usdcFile = filepath
         file = open(usdcFile, 'rb')
         crate = CrateFile(file)
-        usdData = crate.readUsd()
+        usdData = crate.readUsd(lazy = False, tuples = True)
+        crate.close()
         file.close()
         print(usdData.toString(debug = True))
         tempDir = usdcFile[:usdcFile.rfind('/')+1]
@@ -979,7 +979,7 @@ class Scene:
                 self.usdCollections[name] = collection
 
 
-    def exportUsd(self):
+    def createUsdData(self):
         data = UsdData()
         data['upAxis'] = 'Y'
         if self.animated:
@@ -987,11 +987,40 @@ class Scene:
             data['endTimeCode'] = float(self.endFrame)
             data['timeCodesPerSecond'] = float(self.fps)
         data['customLayerData'] = self.customLayerData
+        return data
+
+
+    def exportUsdPrims(self, data):
+        # Yields the top level prims added by each export step
+        steps = []
         if self.exportMaterials:
-            self.exportSharedMaterials(data)
+            steps.append(self.exportSharedMaterials)
         if self.sharedMeshes:
-            self.exportSharedMeshes(data)
-        self.exportCollections(data)
-        for obj in self.objects:
-            obj.exportUsd(data)
+            steps.append(self.exportSharedMeshes)
+        steps.append(self.exportCollections)
+        steps += [obj.exportUsd for obj in self.objects]
+        for step in steps:
+            start = len(data.children)
+            step(data)
+            yield data.children[start:]
+
+
+    def exportUsd(self):
+        data = self.createUsdData()
+        for prims in self.exportUsdPrims(data):
+            pass
         return data
+
+
+    def exportCrate(self, crate):
+        # Write each top level prim as soon as it is exported
+        data = self.createUsdData()
+        crate.beginUsd(data.metadata)
+        for prims in self.exportUsdPrims(data):
+            for prim in prims:
+                crate.writePrim(prim)
+                data.children.remove(prim)
+                # Materials and shared meshes stay referenced as binding
+                # and inherit targets, only their paths are still needed
+                prim.releaseItems()
+        crate.finish()
@@ -100,6 +100,12 @@ class ValueType(Enum):
             return 'float3'
         if self == ValueType.vec4f:
             return 'float4'
+        if self == ValueType.vec2h:
+            return 'half2'
+        if self == ValueType.vec3h:
+            return 'half3'
+        if self == ValueType.vec4h:
+            return 'half4'
         return self.name
 
 
@@ -156,6 +162,26 @@ def getValueType(value):
         return ValueType.Dictionary
     return ValueType.Invalid
 
+def isBufferValue(value):
+    # Contiguous buffers such as array, bytes or numpy arrays
+    try:
+        memoryview(value)
+    except TypeError:
+        return False
+    return True
+
+def isArrayValue(value):
+    return type(value) is list or isBufferValue(value)
+
+def encodePathJump(hasChild, hasSibling, size):
+    # Paths with children and a sibling jump over their subtree of size
+    # paths, -1 marks children only, 0 a sibling only and -2 neither
+    if hasChild and hasSibling:
+        return size
+    if hasChild:
+        return -1
+    return 0 if hasSibling else -2
+
 def getValueTypeFromStr(typeStr):
     typeStr = typeStr.replace('[]', '')
     if typeStr in ('float2', 'texCoord2f'):
@@ -170,9 +196,23 @@ def getValueTypeFromStr(typeStr):
         return ValueType.vec3d
     if typeStr == 'double4':
         return ValueType.vec4d
+    if typeStr in ('half2', 'texCoord2h'):
+        return ValueType.vec2h
+    if typeStr in ('half3', 'color3h', 'normal3h', 'point3h', 'texCoord3h'):
+        return ValueType.vec3h
+    if typeStr in ('half4', 'color4h'):
+        return ValueType.vec4h
     return ValueType[typeStr]
 
+def bufferToList(value):
+    # Typed arrays print like the lists of tuples they are read as
+    def toTuple(item):
+        return tuple(toTuple(i) for i in item) if type(item) is list else item
+    return [toTuple(item) for item in value.tolist()]
+
 def valueToString(value, reduced = False):
+    if isBufferValue(value) and hasattr(value, 'tolist'):
+        value = bufferToList(value[:4] if reduced else value)
     if type(value) is str:
         return value
     if type(value) is int:
@@ -222,6 +262,13 @@ def propertyToString(prop, space):
 def interleaveLists(lists):
     return [x for x in itertools.chain(*itertools.zip_longest(*lists)) if x is not None]
 
+class LazyValue:
+    """Attribute Value Decoded on First Access"""
+    def __init__(self, load, memoize = True):
+        self.load = load
+        self.memoize = memoize
+
+
 class UsdAttribute:
     def __init__(self, name = '', value = None, type = ValueType.Invalid):
         self.name = name
@@ -248,6 +295,34 @@ class UsdAttribute:
     def __getitem__(self, key):
         return self.metadata[key]
 
+    @property
+    def value(self):
+        return self.resolveLazyValue('_value')
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+
+    @property
+    def frames(self):
+        return self.resolveLazyValue('_frames')
+
+    @frames.setter
+    def frames(self, frames):
+        self._frames = frames
+
+    def resolveLazyValue(self, name):
+        value = getattr(self, name)
+        if type(value) is LazyValue:
+            lazy = value
+            value = lazy.load()
+            if lazy.memoize:
+                setattr(self, name, value)
+        return value
+
+    def isLazy(self):
+        return type(self._value) is LazyValue or type(self._frames) is LazyValue
+
     def toString(self, space = '', debug = False):
         ret = space
         att = self.value if self.isConnection() else self
@@ -262,7 +337,7 @@ class UsdAttribute:
         elif self.hasTimeSamples():
             ret += self.framesToString(space, debug)
         else:
-            if self.value != None:
+            if self.value is not None:
                 ret += ' = ' + self.valueToString(debug)
                 if len(self.metadata) > 0:
                     ret += self.metadataToString(space)
@@ -293,7 +368,9 @@ class UsdAttribute:
     def addTimeSample(self, frame, value):
         if self.valueType == ValueType.Invalid:
             self.valueType = getValueType(value)
-        self.frames.append((frame, value))
+        frames = self.frames
+        frames.append((frame, value))
+        self.frames = frames
 
     def valueToString(self, debug = False):
         if self.isConnection():
@@ -315,17 +392,17 @@ class UsdAttribute:
         if self.isConnection():
             return self.value.isArray()
         if len(self.frames) > 0:
-            return type(self.frames[0][1]) is list
-        return self.value != None and type(self.value) is list
+            return isArrayValue(self.frames[0][1])
+        return self.value is not None and isArrayValue(self.value)
 
     def isConnection(self):
-        return type(self.value) is UsdAttribute
+        return type(self._value) is UsdAttribute
 
     def isRelationship(self):
-        return type(self.value) is UsdPrim
+        return type(self._value) is UsdPrim
 
     def hasTimeSamples(self):
-        return len(self.frames) > 0
+        return type(self._frames) is LazyValue or len(self._frames) > 0
 
     def getPathStr(self):
         if self.isConnection():
@@ -334,13 +411,6 @@ class UsdAttribute:
             return self.name
         return self.parent.getPathStr() + '.' + self.name
 
-    def getPathJump(self):
-        self.pathJump = 0
-        if self.parent != None and self.parent.attributes[-1] == self:
-            self.pathJump = -2
-        #print(self.name, ':', self.pathJump)
-        return self.pathJump
-
     def getValueType(self):
         if self.isConnection():
             return self.value.getValueType()
@@ -452,37 +522,56 @@ class UsdPrim:
                 return item
         return None
 
-    def resolvePaths(self, root):
+    def resolvePaths(self, pathItems):
+        stack = [self]
+        while len(stack) > 0:
+            prim = stack.pop()
+            prim.resolveItemPaths(pathItems)
+            stack += prim.children
+
+    def resolveItemPaths(self, pathItems):
         if 'references' in self.metadata:
             pathIndex = self.metadata['references']
-            self.metadata['references'] = root.getItemAtPathIndex(pathIndex)
+            self.metadata['references'] = pathItems.get(pathIndex)
         if 'inheritPaths' in self.metadata:
             paths = self.metadata.pop('inheritPaths')
-            self.metadata['inherits'] = root.getItemAtPathIndex(paths['path'])
+            self.metadata['inherits'] = pathItems.get(paths['path'])
         for att in self.attributes:
             if 'connectionChildren' in att.metadata:
                 pathIndex = att.metadata.pop('connectionChildren')
-                att.value = root.getItemAtPathIndex(pathIndex)
+                att.value = pathItems.get(pathIndex)
             if 'connectionPaths' in att.metadata:
                 paths = att.metadata.pop('connectionPaths')
-                att.value = root.getItemAtPathIndex(paths['path'])
+                att.value = pathItems.get(paths['path'])
             if 'targetChildren' in att.metadata:
                 pathIndex = att.metadata.pop('targetChildren')
-                att.value = root.getItemAtPathIndex(pathIndex)
+                att.value = pathItems.get(pathIndex)
             if 'targetPaths' in att.metadata:
                 paths = att.metadata.pop('targetPaths')
-                att.value = root.getItemAtPathIndex(paths['path'])
-        for child in self.children:
-            child.resolvePaths(root)
+                att.value = pathItems.get(paths['path'])
 
     def updatePathIndices(self, pathIndex):
-        self.pathIndex = pathIndex
-        pathIndex += 1
-        for child in self.children:
-            pathIndex = child.updatePathIndices(pathIndex)
-        for att in self.attributes:
-            att.pathIndex = pathIndex
-            pathIndex += 1
+        # Single pass over the subtree that also sets the path jumps,
+        # a prim jumps over its subtree which ends at the next path index
+        stack = [(self, False)]
+        while len(stack) > 0:
+            prim, visited = stack.pop()
+            if not visited:
+                prim.pathIndex = pathIndex
+                pathIndex += 1
+                stack.append((prim, True))
+                stack += ((child, False) for child in reversed(prim.children))
+                continue
+            for att in prim.attributes:
+                att.pathIndex = pathIndex
+                att.pathJump = 0
+                pathIndex += 1
+            if len(prim.attributes) > 0:
+                prim.attributes[-1].pathJump = -2
+            parent = prim.parent
+            hasChild = len(prim.children) > 0 or len(prim.attributes) > 0
+            hasSibling = parent != None and (parent.children[-1] is not prim or len(parent.attributes) > 0)
+            prim.pathJump = encodePathJump(hasChild, hasSibling, pathIndex - prim.pathIndex)
         return pathIndex
 
     def getPathStr(self):
@@ -490,20 +579,15 @@ class UsdPrim:
             return '/' + self.name
         return self.parent.getPathStr() + '/' + self.name
 
-    def countItems(self):
-        #count = len(self.attributes) + len(self.children)
-        count = len(self.attributes) + len(self.children)
-        for child in self.children:
-            count += child.countItems()
-        return count
-
-    def getPathJump(self):
-        if self.parent == None or (self.parent.children[-1] == self and len(self.parent.attributes) == 0):
-            self.pathJump = -1
-        else:
-            self.pathJump = self.countItems() + 1
-        #print(self.name, ':', self.pathJump)
-        return self.pathJump
+    def releaseItems(self):
+        # Drops the children and attributes of a written subtree, the prims
+        # keep their name and parent so they still resolve as path targets
+        stack = [self]
+        while len(stack) > 0:
+            prim = stack.pop()
+            stack += prim.children
+            prim.children = []
+            prim.attributes = []
 
 
 class UsdData:
@@ -561,11 +645,7 @@ class UsdData:
         pathIndex = 1
         for child in self.children:
             pathIndex = child.updatePathIndices(pathIndex)
-
-    def getPathJump(self):
-        self.pathJump = -1 if len(self.children) > 0 else -2
-        #print('root:', self.pathJump)
-        return self.pathJump
+        self.pathJump = encodePathJump(len(self.children) > 0, False, 0)
 
     def getItemAtPathIndex(self, pathIndex):
         for child in self.children:
@@ -576,9 +656,22 @@ class UsdData:
                 return item
         return None
 
-    def resolvePaths(self):
+    def getPathItems(self):
+        # Prims and attributes by path index, built in a single pass
+        items = {}
+        stack = [self]
+        while len(stack) > 0:
+            prim = stack.pop()
+            for item in prim.attributes + prim.children:
+                items.setdefault(item.pathIndex, item)
+            stack += reversed(prim.children)
+        return items
+
+    def resolvePaths(self, pathItems = None):
+        if pathItems == None:
+            pathItems = self.getPathItems()
         for child in self.children:
-            child.resolvePaths(self)
+            child.resolvePaths(pathItems)
 
     def writeUsda(self, filePath):
         f = open(filePath, 'w')
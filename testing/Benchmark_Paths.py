@@ -0,0 +1,63 @@
+import bpy
+import io
+import os
+import sys
+import time
+import importlib
+
+scriptPath = bpy.path.abspath("//") + '//..'
+if not scriptPath in sys.path:
+    sys.path.append(scriptPath)
+
+import io_scene_usdz
+
+importlib.reload(io_scene_usdz)
+
+import io_scene_usdz.crate_file
+
+importlib.reload(io_scene_usdz.crate_file)
+
+
+from io_scene_usdz.crate_file import *
+from io_scene_usdz.value_types import *
+
+
+def buildTree(numPaths, branches = 3):
+    # Prims with an attribute each, numPaths paths in total
+    data = UsdData()
+    prims = [data.createChild('Root', ClassType.Xform)]
+    numPaths -= 1
+    index = 0
+    while numPaths > 1:
+        prim = prims[index // branches].createChild('P%d' % index, ClassType.Xform)
+        prim.createAttribute('a', float(index), ValueType.float)
+        prims.append(prim)
+        numPaths -= 2
+        index += 1
+    return data
+
+
+def buildChain(depth):
+    # A single deep hierarchy like a long armature
+    data = UsdData()
+    prim = data.createChild('Root', ClassType.Xform)
+    for i in range(depth):
+        prim = prim.createChild('Bone%d' % i, ClassType.Xform)
+        prim.createAttribute('a', float(i), ValueType.float)
+    return data
+
+
+def writeCrate(data):
+    # Time writing the whole crate, paths and specs included
+    start = time.time()
+    CrateFile(io.BytesIO()).writeUsd(data)
+    return time.time() - start
+
+
+for numPaths in (10000, 100000, 1000000):
+    elapsed = writeCrate(buildTree(numPaths))
+    print('Tree  %8d paths: %.3fs, %.2fus per path' % (numPaths, elapsed, elapsed * 1e6 / numPaths))
+
+for depth in (1000, 10000, 100000):
+    elapsed = writeCrate(buildChain(depth))
+    print('Chain %8d deep:  %.3fs, %.2fus per path' % (depth, elapsed, elapsed * 1e6 / (2 * depth + 1)))
@@ -0,0 +1,64 @@
+import bpy
+import io
+import os
+import sys
+import time
+import importlib
+
+scriptPath = bpy.path.abspath("//") + '//..'
+if not scriptPath in sys.path:
+    sys.path.append(scriptPath)
+
+import io_scene_usdz
+
+importlib.reload(io_scene_usdz)
+
+import io_scene_usdz.crate_file
+
+importlib.reload(io_scene_usdz.crate_file)
+
+
+from io_scene_usdz.crate_file import *
+from io_scene_usdz.value_types import *
+
+
+def buildScene(numMaterials):
+    # Each material has a shader connection and is bound by a mesh
+    data = UsdData()
+    root = data.createChild('Root', ClassType.Xform)
+    looks = root.createChild('Looks', ClassType.Scope)
+    meshes = root.createChild('Meshes', ClassType.Scope)
+    for i in range(numMaterials):
+        material = looks.createChild('Material%d' % i, ClassType.Material)
+        shader = material.createChild('Shader', ClassType.Shader)
+        shader['inputs:roughness'] = 0.5
+        shader['outputs:surface'] = ValueType.token
+        material['outputs:surface'] = shader['outputs:surface']
+        mesh = meshes.createChild('Mesh%d' % i, ClassType.Mesh)
+        mesh['material:binding'] = material
+    file = io.BytesIO()
+    CrateFile(file).writeUsd(data)
+    return file.getvalue()
+
+
+def resolveByTreeWalk(data, pathIndices):
+    # Lookups the way resolvePaths used to make them
+    start = time.time()
+    for pathIndex in pathIndices:
+        data.getItemAtPathIndex(pathIndex)
+    return time.time() - start
+
+
+for numMaterials in (1000, 5000, 10000, 50000):
+    crate = buildScene(numMaterials)
+    start = time.time()
+    data = CrateFile(crate).readUsd()
+    elapsed = time.time() - start
+    meshes = data.children[0].children[1].children
+    assert all(mesh['material:binding'].value.name == 'Material%d' % i for i, mesh in enumerate(meshes))
+    numConnections = 2 * numMaterials
+    print('%6d connections: read %.3fs, %.2fus per connection' % (numConnections, elapsed, elapsed * 1e6 / numConnections))
+    if numMaterials <= 5000:
+        pathIndices = [mesh['material:binding'].value.pathIndex for mesh in meshes]
+        walk = resolveByTreeWalk(data, pathIndices[::10])
+        print('%6d tree walk lookups: %.3fs' % (len(pathIndices) // 10, walk))
@@ -0,0 +1,62 @@
+import bpy
+import io
+import os
+import sys
+import struct
+import random
+import importlib
+from array import array
+
+scriptPath = bpy.path.abspath("//") + '//..'
+if not scriptPath in sys.path:
+    sys.path.append(scriptPath)
+
+import io_scene_usdz
+
+importlib.reload(io_scene_usdz)
+
+import io_scene_usdz.crate_file
+
+importlib.reload(io_scene_usdz.crate_file)
+
+
+import io_scene_usdz.crate_file as crate_file
+from io_scene_usdz.crate_file import *
+from io_scene_usdz.value_types import *
+
+
+def writeCrate(points, matrices, frames):
+    data = UsdData()
+    prim = data.createChild('Root', ClassType.Xform)
+    prim.createAttribute('points', points, ValueType.vec3f)
+    prim.createAttribute('matrices', matrices, ValueType.matrix4d)
+    att = prim.createAttribute('samples', type=ValueType.vec3f)
+    for frame, value in enumerate(frames):
+        att.addTimeSample(frame, value)
+    file = io.BytesIO()
+    CrateFile(file).writeUsd(data)
+    return file.getvalue()
+
+
+random.seed(0)
+points = [(random.random(), random.random(), float(i)) for i in range(1000)]
+matrices = [((1.0, 0.0, 0.0, 0.0), (0.0, 1.0, 0.0, 0.0), (0.0, 0.0, 1.0, 0.0), (float(i), 0.0, 0.0, 1.0)) for i in range(10)]
+frames = [points[i:i + 20] for i in range(5)]
+expected = writeCrate(points, matrices, frames)
+
+result = CrateFile(io.BytesIO(expected)).readUsd(tuples = True)
+attributes = result.children[0].attributes
+rounded = roundFloats([c for p in points for c in p], 'f')
+assert [c for p in attributes[0].value for c in p] == list(rounded)
+assert attributes[1].value == matrices
+
+# Buffers of components write the same bytes as lists of tuples
+flat = [c for p in points for c in p]
+buffers = [array('f', flat), array('d', flat), struct.pack('<%df' % len(flat), *flat)]
+flatFrames = [array('f', [c for p in f for c in p]) for f in frames]
+for buffer in buffers:
+    assert writeCrate(buffer, matrices, flatFrames) == expected
+if crate_file.np != None:
+    np = crate_file.np
+    assert writeCrate(np.array(points), np.array(matrices), [np.array(f) for f in frames]) == expected
+print('Array Packing Tests Passed')
@@ -0,0 +1,76 @@
+import bpy
+import io
+import os
+import sys
+import random
+import tempfile
+import importlib
+
+scriptPath = bpy.path.abspath("//") + '//..'
+if not scriptPath in sys.path:
+    sys.path.append(scriptPath)
+
+import io_scene_usdz
+
+importlib.reload(io_scene_usdz)
+
+import io_scene_usdz.crate_file
+
+importlib.reload(io_scene_usdz.crate_file)
+
+
+from io_scene_usdz.crate_file import *
+from io_scene_usdz.value_types import *
+
+
+class RecordingFile(io.BytesIO):
+    """Byte Buffer that Counts Writes and Seeks"""
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+        self.seeks = 0
+
+    def write(self, data):
+        self.writes += 1
+        return super().write(data)
+
+    def seek(self, pos, whence = 0):
+        self.seeks += 1
+        return super().seek(pos, whence)
+
+
+def buildData():
+    random.seed(0)
+    data = UsdData()
+    data['upAxis'] = 'Y'
+    root = data.createChild('Root', ClassType.Xform)
+    mesh = root.createChild('Mesh', ClassType.Mesh)
+    mesh['points'] = [(random.random(), 0.0, float(i)) for i in range(2000)]
+    mesh['faceVertexIndices'] = list(range(2000))
+    att = root.createAttribute('xformOp:translate', type=ValueType.vec3f)
+    for frame in range(20):
+        att.addTimeSample(frame, (float(frame), 0.0, 0.0))
+    for i in range(100):
+        root.createChild('Prim%d' % i, ClassType.Scope)['size'] = float(i)
+    return data
+
+
+# The buffered writer gives the same bytes as writing the file directly
+with tempfile.TemporaryFile() as file:
+    CrateFile(file).writeUsdData(buildData())
+    file.seek(0)
+    direct = file.read()
+with tempfile.TemporaryFile() as file:
+    CrateFile(file).writeUsd(buildData())
+    file.seek(0)
+    assert file.read() == direct
+
+# The target file gets a single write and is never seeked
+file = RecordingFile()
+CrateFile(file).writeUsd(buildData())
+assert file.getvalue() == direct
+assert file.writes == 1 and file.seeks == 0
+file = RecordingFile()
+CrateFile(file).writeUsdData(buildData())
+assert file.writes > 100 and file.seeks > 0
+print('Buffered Writer Tests Passed')
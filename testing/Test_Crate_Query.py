@@ -0,0 +1,89 @@
+import bpy
+import io
+import os
+import sys
+import tempfile
+import importlib
+
+scriptPath = bpy.path.abspath("//") + '//..'
+if not scriptPath in sys.path:
+    sys.path.append(scriptPath)
+
+import io_scene_usdz
+
+importlib.reload(io_scene_usdz)
+
+import io_scene_usdz.crate_file
+
+importlib.reload(io_scene_usdz.crate_file)
+
+
+from io_scene_usdz.crate_file import *
+from io_scene_usdz.value_types import *
+
+
+def buildData():
+    data = UsdData()
+    data['upAxis'] = 'Y'
+    root = data.createChild('Root', ClassType.Xform)
+    looks = root.createChild('Looks', ClassType.Scope)
+    material = looks.createChild('Material', ClassType.Material)
+    shader = material.createChild('Shader', ClassType.Shader)
+    shader['inputs:roughness'] = 0.5
+    shader['outputs:surface'] = ValueType.token
+    material['outputs:surface'] = shader['outputs:surface']
+    body = root.createChild('Body', ClassType.Xform)
+    mesh = body.createChild('Mesh', ClassType.Mesh)
+    mesh['points'] = [(0.0, 1.0, float(i)) for i in range(100)]
+    mesh['extent'] = [(0.0, 0.0, 0.0), (1.0, 1.0, 99.0)]
+    mesh['material:binding'] = material
+    att = body.createAttribute('xformOp:translate', type=ValueType.vec3f)
+    for frame in range(3):
+        att.addTimeSample(frame, (float(frame), 0.0, 0.0))
+    return data
+
+
+def checkQueries(crate):
+    assert list(crate.get('/Root/Body/Mesh.points')[99]) == [0.0, 1.0, 99.0]
+    assert crate.get('/Root/Looks/Material/Shader.inputs:roughness') == 0.5
+    assert crate.get('/Root/Body/Mesh.material:binding') == '/Root/Looks/Material'
+    assert crate.get('/Root/Looks/Material.outputs:surface') == '/Root/Looks/Material/Shader.outputs:surface'
+    assert [f for f, v in crate.get('/Root/Body.xformOp:translate')] == [0.0, 1.0, 2.0]
+    assert crate.get('/Root/Body/Mesh', 'typeName') == 'Mesh'
+    assert crate.get('/')['upAxis'] == 'Y'
+    assert crate.get('/Root/Missing.points') == None
+    assert crate.listChildren('/') == ['/Root']
+    assert crate.listChildren('/Root') == ['/Root/Looks', '/Root/Body']
+    assert crate.listChildren('/Root/Body') == ['/Root/Body/Mesh']
+    assert crate.listChildren('/Root/Body/Mesh', properties = True) == ['/Root/Body/Mesh.points', '/Root/Body/Mesh.extent', '/Root/Body/Mesh.material:binding']
+
+
+file = io.BytesIO()
+CrateFile(file).writeUsd(buildData())
+crate = file.getvalue()
+checkQueries(CrateFile(crate))
+
+# The sidecar index replaces the path and spec tables once written
+with tempfile.TemporaryDirectory() as tempDir:
+    indexPath = os.path.join(tempDir, 'crate.index')
+    reader = CrateFile(crate)
+    reader.loadQueryIndex(indexPath)
+    assert os.path.exists(indexPath) and len(reader.paths) > 0
+    checkQueries(reader)
+    reader = CrateFile(crate)
+    reader.loadQueryIndex(indexPath)
+    assert len(reader.paths) == 0
+    checkQueries(reader)
+    # A stale index is rebuilt from the crate
+    data = buildData()
+    data.children[0].createChild('Extra', ClassType.Xform)
+    file = io.BytesIO()
+    CrateFile(file).writeUsd(data)
+    reader = CrateFile(file.getvalue())
+    reader.loadQueryIndex(indexPath)
+    assert len(reader.paths) > 0
+    assert reader.listChildren('/Root') == ['/Root/Looks', '/Root/Body', '/Root/Extra']
+    reader = CrateFile(file.getvalue())
+    reader.loadQueryIndex(indexPath)
+    assert len(reader.paths) == 0 and reader.listChildren('/Root')[-1] == '/Root/Extra'
+print('Crate Query Tests Passed')
@@ -0,0 +1,66 @@
+import bpy
+import io
+import os
+import sys
+import random
+import tracemalloc
+import importlib
+
+scriptPath = bpy.path.abspath("//") + '//..'
+if not scriptPath in sys.path:
+    sys.path.append(scriptPath)
+
+import io_scene_usdz
+
+importlib.reload(io_scene_usdz)
+
+import io_scene_usdz.crate_file
+
+importlib.reload(io_scene_usdz.crate_file)
+
+
+from io_scene_usdz.crate_file import *
+from io_scene_usdz.value_types import *
+
+
+def fillIndex(index, count):
+    # Returns the memory held by the index once filled
+    tracemalloc.start()
+    for i in range(count):
+        index.add(index.getKey([float(i)] * 100, ValueType.float), (i + 1) << 20)
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return used
+
+
+random.seed(0)
+points = [(random.random(), random.random(), float(i)) for i in range(1000)]
+
+# Repeated arrays are written once and counted as index hits
+data = UsdData()
+for i in range(3):
+    prim = data.createChild('Mesh%d' % i, ClassType.Mesh)
+    prim.createAttribute('points', points, ValueType.vec3f)
+file = io.BytesIO()
+crate = CrateFile(file)
+crate.writeUsd(data)
+assert crate.dataIndex.hits >= 2 and crate.dataIndex.savedBytes >= 2 * 12 * len(points)
+# Values under the minimum size are not indexed
+crate = CrateFile(io.BytesIO(), dedupMinSize = 1024)
+crate.writeUsd(data)
+assert crate.dataIndex.hits == 2 and crate.dataIndex.skipped > 0
+# An index too small for one entry evicts everything and writes every copy
+small = io.BytesIO()
+crate = CrateFile(small, dedupMaxBytes = 0)
+crate.writeUsd(data)
+assert crate.dataIndex.hits == 0 and crate.dataIndex.evictions > 0
+assert len(small.getvalue()) > len(file.getvalue()) + 2 * 12 * len(points)
+
+# The byte budget charges the memory each entry really holds
+index = DataIndex()
+used = fillIndex(index, 20000)
+assert index.evictions == 0 and abs(index.size - used) < used * 0.2, (index.size, used)
+index = DataIndex(maxBytes = 64 * 1024)
+used = fillIndex(index, 20000)
+assert index.evictions > 0 and index.size <= index.maxBytes and used < 2 * index.maxBytes
+print('Data Index Tests Passed')
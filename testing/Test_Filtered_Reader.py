@@ -0,0 +1,92 @@
+import bpy
+import io
+import os
+import sys
+import importlib
+
+scriptPath = bpy.path.abspath("//") + '//..'
+if not scriptPath in sys.path:
+    sys.path.append(scriptPath)
+
+import io_scene_usdz
+
+importlib.reload(io_scene_usdz)
+
+import io_scene_usdz.crate_file
+
+importlib.reload(io_scene_usdz.crate_file)
+
+
+from io_scene_usdz.crate_file import *
+from io_scene_usdz.value_types import *
+
+
+def buildData():
+    data = UsdData()
+    root = data.createChild('Root', ClassType.Xform)
+    root['xformOp:translate'] = (1.0, 2.0, 3.0)
+    looks = root.createChild('Looks', ClassType.Scope)
+    material = looks.createChild('Material', ClassType.Material)
+    shader = material.createChild('Shader', ClassType.Shader)
+    shader['inputs:roughness'] = 0.5
+    body = root.createChild('Body', ClassType.Xform)
+    mesh = body.createChild('Mesh', ClassType.Mesh)
+    mesh['points'] = [(0.0, 1.0, float(i)) for i in range(100)]
+    mesh['extent'] = [(0.0, 0.0, 0.0), (1.0, 1.0, 99.0)]
+    mesh['material:binding'] = material
+    return data
+
+
+def readFiltered(crate, **filters):
+    # Tree of prim and property paths and the number of decoded values
+    reader = CrateFile(crate)
+    getRepValue = reader.getRepValue
+    decoded = []
+    def countRepValue(rep):
+        decoded.append(rep)
+        return getRepValue(rep)
+    reader.getRepValue = countRepValue
+    data = reader.readUsd(lazy = False, **filters)
+    paths = []
+    stack = list(reversed(data.children))
+    while len(stack) > 0:
+        prim = stack.pop()
+        paths.append(prim.getPathStr())
+        paths += [att.getPathStr() for att in prim.attributes]
+        stack += reversed(prim.children)
+    return data, paths, len(decoded)
+
+
+file = io.BytesIO()
+CrateFile(file).writeUsd(buildData())
+crate = file.getvalue()
+data, paths, numDecoded = readFiltered(crate)
+assert data.toString() == CrateFile(crate).readUsd().toString()
+
+# Path prefixes keep the ancestors without their properties
+data, paths, count = readFiltered(crate, include = ['/Root/Looks'])
+assert paths == ['/Root', '/Root/Looks', '/Root/Looks/Material', '/Root/Looks/Material/Shader', '/Root/Looks/Material/Shader.inputs:roughness']
+assert count < numDecoded
+data, paths, count = readFiltered(crate, include = ['/Root/Body/Mesh.points'])
+assert paths == ['/Root', '/Root/Body', '/Root/Body/Mesh', '/Root/Body/Mesh.points']
+
+# Prim class types and property name patterns
+data, paths, count = readFiltered(crate, include = [ClassType.Mesh], exclude = ['points'])
+assert paths == ['/Root', '/Root/Body', '/Root/Body/Mesh', '/Root/Body/Mesh.extent', '/Root/Body/Mesh.material:binding']
+data, paths, count = readFiltered(crate, include = ['extent', 'material:*'])
+mesh = data.children[0].children[1].children[0]
+assert [att.name for att in mesh.attributes] == ['extent', 'material:binding']
+assert mesh['material:binding'].value.getPathStr() == '/Root/Looks/Material'
+assert len(data.children[0].attributes) == 0 and len(mesh['extent'].value) == 2
+data, paths, count = readFiltered(crate, exclude = ['/Root/Looks', ClassType.Mesh])
+assert paths == ['/Root', '/Root.xformOp:translate', '/Root/Body']
+data, paths, count = readFiltered(crate, exclude = [ClassType.Xform])
+assert paths == [] and count < numDecoded
+
+# Metadata only reads skip the attribute values
+data, paths, count = readFiltered(crate, metadataOnly = True)
+mesh = data.children[0].children[1].children[0]
+assert len(paths) == 11 and mesh['points'].value == None
+assert mesh['points'].valueType == ValueType.vec3f
+assert mesh['material:binding'].value.name == 'Material'
+print('Filtered Reader Tests Passed')
@@ -0,0 +1,76 @@
+import bpy
+import io
+import os
+import sys
+import random
+import importlib
+
+scriptPath = bpy.path.abspath("//") + '//..'
+if not scriptPath in sys.path:
+    sys.path.append(scriptPath)
+
+import io_scene_usdz
+
+importlib.reload(io_scene_usdz)
+
+import io_scene_usdz.crate_file
+
+importlib.reload(io_scene_usdz.crate_file)
+
+
+import io_scene_usdz.crate_file as crate_file
+from io_scene_usdz.crate_file import *
+from io_scene_usdz.value_types import *
+
+
+def makeFloatLists():
+    random.seed(0)
+    lists = [
+        [0.5] * 15,
+        [float(i) for i in range(100)],
+        [float(i % 7 - 3) for i in range(500)],
+        [2.0**31] * 20,
+        [0.0, 1.0, 0.5, 0.25] * 50,
+        [random.choice((0.1, 0.2, 0.3)) for i in range(300)],
+        [float(i) + 0.5 for i in range(2000)],
+        [random.random() for i in range(500)],
+        [-0.0, 0.0, 1.5, 2.5] * 10,
+    ]
+    return lists
+
+
+def roundTrip(values, vType, useNumpy):
+    numpy = crate_file.np
+    if not useNumpy:
+        crate_file.np = None
+    try:
+        data = UsdData()
+        prim = data.createChild('Root', ClassType.Xform)
+        prim.createAttribute('values', values, vType)
+        file = io.BytesIO()
+        CrateFile(file).writeUsd(data)
+        file.seek(0)
+        result = CrateFile(file).readUsd()
+        return file.getvalue(), result.children[0].attributes[0].value
+    finally:
+        crate_file.np = numpy
+
+
+for values in makeFloatLists():
+    for vType, packType in ((ValueType.float, 'f'), (ValueType.double, 'd')):
+        expected = list(roundFloats(values, packType))
+        data, decoded = roundTrip(values, vType, False)
+        assert list(decoded) == expected
+        if crate_file.np != None:
+            # NumPy and pure Python produce the same file
+            numpyData, numpyDecoded = roundTrip(values, vType, True)
+            assert numpyData == data
+            assert list(numpyDecoded) == expected
+
+assert getWholeInts([1.0, -2.0, 3.0]) == [1, -2, 3]
+assert getWholeInts([1.0, 2.5]) == None
+assert getWholeInts([float('inf')] * 4) == None
+assert getLookupTable([3.0, 1.0, 3.0, 2.0] * 4) == ([3.0, 1.0, 2.0], [0, 1, 0, 2] * 4)
+assert getLookupTable([float(i) for i in range(16)]) == (None, None)
+print('NumPy:', crate_file.np != None)
+print('Float Compression Tests Passed')
@@ -0,0 +1,101 @@
+import bpy
+import os
+import sys
+import random
+import importlib
+
+scriptPath = bpy.path.abspath("//") + '//..'
+if not scriptPath in sys.path:
+    sys.path.append(scriptPath)
+
+import io_scene_usdz
+
+importlib.reload(io_scene_usdz)
+
+import io_scene_usdz.compression_utils
+
+importlib.reload(io_scene_usdz.compression_utils)
+
+
+import io_scene_usdz.compression_utils as compression_utils
+from io_scene_usdz.compression_utils import *
+
+
+def makeIntLists(intSize):
+    random.seed(0)
+    bits = intSize * 8
+    limit = (1 << (bits - 2)) - 1
+    edges = []
+    for size in (1, 2, 4):
+        if size < intSize:
+            edge = 1 << (size * 8 - 1)
+            edges += [edge - 1, edge, -edge, -edge - 1]
+    lists = [
+        [],
+        [7],
+        [3, 3, 3],
+        list(range(1000)),
+        [i % 4 for i in range(1001)],
+        [0, 1, 0, 1] * 100,
+        [random.randint(-200, 200) for i in range(500)],
+        [random.randint(-limit, limit) for i in range(500)],
+        [random.choice(edges) * (i % 3) for i in range(500)],
+        [sum(edges[:i % len(edges)]) for i in range(300)],
+    ]
+    return lists
+
+
+def compress(values, intSize, useNumpy):
+    numpy = compression_utils.np
+    minInts = compression_utils.NUMPY_MIN_INTS
+    if useNumpy:
+        compression_utils.NUMPY_MIN_INTS = 0
+    else:
+        compression_utils.np = None
+    try:
+        data = usdIntCompress(values, intSize)
+        return data, usdIntDecompress(data, len(values), intSize)
+    finally:
+        compression_utils.np = numpy
+        compression_utils.NUMPY_MIN_INTS = minInts
+
+
+for intSize in (4, 8):
+    for values in makeIntLists(intSize):
+        data, decoded = compress(values, intSize, False)
+        assert decoded == values
+        assert len(data) <= usdIntCompressedSize(len(values), intSize)
+        if compression_utils.np != None:
+            # NumPy and pure Python produce the same bytes
+            numpyData, numpyDecoded = compress(values, intSize, True)
+            assert bytes(numpyData) == bytes(data)
+            assert numpyDecoded == values
+
+for size in (1, 2, 3, 4, 8):
+    for signed in (False, True):
+        values = list(range(-100, 100)) if signed else list(range(200))
+        for byteorder in ('little', 'big'):
+            data = encodeInts(values, size, byteorder, signed)
+            assert bytes(data) == b''.join(i.to_bytes(size, byteorder, signed=signed) for i in values)
+            assert decodeInts(data, len(values), size, byteorder, signed) == values
+            assert list(decodeInts(data, len(values), size, byteorder, signed, view=True)) == values
+
+# Views over writable buffers are read only, in either byte order
+for size in (1, 2, 4, 8):
+    for byteorder in ('little', 'big'):
+        data = bytearray(encodeInts(list(range(10)), size, byteorder))
+        ints = decodeInts(data, 10, size, byteorder, view=True)
+        try:
+            ints[0] = 5
+            assert False
+        except TypeError:
+            pass
+        assert data == encodeInts(list(range(10)), size, byteorder)
+
+assert decodeStrings(encodeStrings(['a', '', 'bc']), 3) == ['a', '', 'bc']
+assert decodeStrings(b'a\x00bc\x00d', 5) == ['a', 'bc']
+
+assert usdInt32Decompress(usdInt32Compress(list(range(100))), 100) == list(range(100))
+assert usdInt64Decompress(usdInt64Compress([1 << 40] * 100), 100) == [1 << 40] * 100
+print('NumPy:', compression_utils.np != None)
+print('Int Compression Tests Passed')
@@ -0,0 +1,73 @@
+import bpy
+import io
+import os
+import sys
+import importlib
+
+scriptPath = bpy.path.abspath("//") + '//..'
+if not scriptPath in sys.path:
+    sys.path.append(scriptPath)
+
+import io_scene_usdz
+
+importlib.reload(io_scene_usdz)
+
+import io_scene_usdz.crate_file
+
+importlib.reload(io_scene_usdz.crate_file)
+
+
+from io_scene_usdz.crate_file import *
+from io_scene_usdz.value_types import *
+
+
+def buildData(numShaders):
+    data = UsdData()
+    data['customLayerData'] = {'creator': 'test', 'note': 'test'}
+    looks = data.createChild('Looks', ClassType.Scope)
+    for i in range(numShaders):
+        shader = looks.createChild('Shader%d' % i, ClassType.Shader)
+        shader['info:id'] = 'UsdPreviewSurface'
+        shader['inputs:roughness'] = 0.5
+    return data
+
+
+def writeData(numShaders):
+    file = io.BytesIO()
+    crate = CrateFile(file)
+    crate.writeUsd(buildData(numShaders))
+    return crate, file.getvalue()
+
+
+# Specs with the same fields share one FIELDSETS entry
+small, smallData = writeData(2)
+large, largeData = writeData(200)
+assert large.fsets.count(-1) == small.fsets.count(-1)
+shaderSets = set(fset for path, fset, sType in large.specs if sType == SpecType.Prim.value)
+assert len(shaderSets) == 2
+result = CrateFile(io.BytesIO(largeData)).readUsd()
+shaders = result.children[0].children
+assert len(shaders) == 200
+assert all(s['inputs:roughness'].value == 0.5 for s in shaders)
+assert result['customLayerData'] == {'creator': 'test', 'note': 'test'}
+
+crate = CrateFile(io.BytesIO())
+first = crate.addFieldSet([3, 1, 2])
+assert crate.addFieldSet([3, 1, 2]) == first
+second = crate.addFieldSet([1, 2, 3])
+assert second != first and crate.addFieldSet([3, 1, 2]) == first
+assert crate.fsets == [3, 1, 2, -1, 1, 2, 3, -1]
+
+# Strings are stored once and keep the index of their first use
+assert len(large.strings) == len(set(large.strings))
+assert [large.tokens[t] for t in large.strings].count('test') == 1
+assert large.strings == small.strings
+names = ['test', 'shader', '', 'test', 'other', 'shader']
+indices = [crate.getStringIndex(name) for name in names]
+assert indices == [0, 1, 2, 0, 3, 1]
+assert [crate.tokens[t] for t in crate.strings] == ['test', 'shader', '', 'other']
+assert [crate.getStringIndex(name) for name in names] == indices
+
+# The same stage always writes the same bytes
+assert writeData(200)[1] == largeData
+print('Interning Tests Passed')
@@ -0,0 +1,269 @@
+import bpy
+import io
+import os
+import sys
+import math
+import random
+import struct
+import importlib
+
+scriptPath = bpy.path.abspath("//") + '//..'
+if not scriptPath in sys.path:
+    sys.path.append(scriptPath)
+
+import io_scene_usdz
+
+importlib.reload(io_scene_usdz)
+
+import io_scene_usdz.compression_utils
+
+importlib.reload(io_scene_usdz.compression_utils)
+
+
+import io_scene_usdz.compression_utils as compression_utils
+from io_scene_usdz.compression_utils import *
+
+
+def referenceDecompressChunk(src):
+    # Byte by byte decoder used to check the output of lz4DecompressChunk
+    dst = bytearray()
+    srcPtr = 0
+    while srcPtr < len(src):
+        token = src[srcPtr]
+        srcPtr += 1
+        litLen = token >> 4
+        if litLen == 15:
+            while src[srcPtr] == 255:
+                litLen += 255
+                srcPtr += 1
+            litLen += src[srcPtr]
+            srcPtr += 1
+        dst += src[srcPtr:srcPtr + litLen]
+        srcPtr += litLen
+        if srcPtr >= len(src):
+            break
+        offset = int.from_bytes(src[srcPtr:srcPtr + 2], 'little')
+        srcPtr += 2
+        matchLen = token & 0x0F
+        if matchLen == 15:
+            while src[srcPtr] == 255:
+                matchLen += 255
+                srcPtr += 1
+            matchLen += src[srcPtr]
+            srcPtr += 1
+        for i in range(matchLen + MIN_MATCH):
+            dst.append(dst[len(dst) - offset])
+    return dst
+
+
+def makeBuffers():
+    random.seed(0)
+    buffers = [
+        b'',
+        b'a',
+        b'abcd' * 3,
+        bytes(1000),
+        b'ab' * 5000,
+        b'abc' * 5000,
+        bytes(random.getrandbits(8) for i in range(5000)),
+        bytes(random.choice(b'abcd') for i in range(20000)),
+        encodeInts(list(range(5000)), 4),
+        encodeStrings(['token%d' % (i % 300) for i in range(3000)]),
+    ]
+    return buffers
+
+
+def testDecompress(src, level = 0, acceleration = 1):
+    compressed = lz4Compress(src, level, acceleration)
+    if len(src) == 0:
+        assert len(compressed) == 0
+        return
+    expected = referenceDecompressChunk(bytes(compressed[1:]))
+    assert expected == src
+    # Unknown, exact, short and over sized output buffers
+    assert lz4Decompress(compressed) == expected
+    assert lz4Decompress(compressed, len(src)) == expected
+    assert lz4Decompress(compressed, len(src) // 2) == expected
+    assert lz4Decompress(compressed, len(src) * 2) == expected
+
+
+def testOverlappingMatches():
+    # Hand built blocks with match offsets shorter than the match length
+    for offset in range(1, 9):
+        literal = bytes(range(1, offset + 1))
+        for matchLen in (4, 5, 17, 18, 300):
+            block = bytearray()
+            length = matchLen - MIN_MATCH
+            token = (offset << 4) | min(length, 15)
+            block.append(token)
+            block += literal
+            block += offset.to_bytes(2, 'little')
+            if length >= 15:
+                length -= 15
+                while length >= 255:
+                    block.append(255)
+                    length -= 255
+                block.append(length)
+            block.append(0x10)
+            block += b'z'
+            expected = referenceDecompressChunk(bytes(block))
+            assert lz4DecompressChunk(block) == expected
+            assert lz4DecompressChunk(block, len(expected)) == expected
+
+
+def testCorruptOffsets():
+    # Zero offsets and offsets before the start of the output are rejected
+    for offset in (0, 4, 5, 300):
+        block = bytearray((0x40,)) + b'abcd' + offset.to_bytes(2, 'little')
+        block += bytes((0x10,)) + b'z'
+        try:
+            lz4DecompressChunk(block)
+            assert offset == 4
+        except ValueError:
+            assert offset != 4
+    assert lz4DecompressChunk(bytes((0x40,)) + b'abcd' + bytes((4, 0, 0x10)) + b'z') == b'abcdabcdz'
+    # A match right at the start of the output has nothing to copy from
+    try:
+        lz4Decompress(bytes((0, 0x00, 1, 0)) + bytes((0x10,)) + b'z')
+        assert False
+    except ValueError:
+        pass
+
+
+def testCodecInterop(src, level = 0):
+    # Every backend must decode the streams of every other backend
+    for encoder in LZ4_CODECS.values():
+        compressed = encoder.compress(src, level)
+        for decoder in LZ4_CODECS.values():
+            assert decoder.decompress(compressed) == src
+            assert decoder.decompress(compressed, len(src)) == src
+
+
+def testChunks(src, workers = 1):
+    # Sizes on either side of the chunk boundaries
+    for chunkSize in (16, 1000, 4096):
+        for length in (chunkSize - 1, chunkSize, chunkSize + 1, 3 * chunkSize, 3 * chunkSize + 5):
+            data = src[:length]
+            for encoder in LZ4_CODECS.values():
+                compressed = encoder.compress(data, chunkSize=chunkSize, workers=workers)
+                numChunks = -(-len(data) // chunkSize) if len(data) > chunkSize else 0
+                assert len(data) == 0 or compressed[0] == min(numChunks, LZ4_MAX_CHUNKS)
+                for decoder in LZ4_CODECS.values():
+                    assert decoder.decompress(compressed, workers=workers) == data
+                    assert decoder.decompress(compressed, len(data), workers) == data
+                # Streaming small pieces writes the same bytes
+                file = io.BytesIO()
+                file.write(b'head')
+                pieces = (data[i:i + 7] for i in range(0, len(data), 7))
+                sizes = encoder.compressStream(file, pieces, chunkSize=chunkSize)
+                assert sizes == (len(data), len(compressed))
+                assert file.getvalue() == b'head' + compressed
+
+
+def testManyChunks():
+    # Streams past the chunk count limit grow their chunks from the size hint
+    random.seed(3)
+    data = bytes(random.choice(b'abcdefgh') for i in range(400000))
+    pieces = [data[i:i + 999] for i in range(0, len(data), 999)]
+    for encoder in LZ4_CODECS.values():
+        compressed = encoder.compress(data, chunkSize=1000)
+        assert compressed[0] == LZ4_MAX_CHUNKS
+        file = io.BytesIO()
+        sizes = encoder.compressStream(file, iter(pieces), chunkSize=1000, inputSize=len(data))
+        assert sizes == (len(data), len(compressed))
+        assert file.getvalue() == compressed
+        for decoder in LZ4_CODECS.values():
+            assert decoder.decompress(file.getvalue(), len(data)) == data
+        # Without the hint the stream fails instead of dropping input
+        try:
+            encoder.compressStream(io.BytesIO(), iter(pieces), chunkSize=1000)
+            assert False
+        except ValueError:
+            pass
+
+
+def testSkip():
+    # Incompressible buffers are stored as a literal only block
+    random.seed(1)
+    noise = bytes(random.getrandbits(8) for i in range(LZ4_SKIP_MIN_SIZE * 2))
+    for src in (noise, b'abcd' * LZ4_SKIP_MIN_SIZE):
+        for encoder in LZ4_CODECS.values():
+            stats = {}
+            compressed = encoder.compress(src, stats=stats)
+            assert stats == {'skipped' if src is noise else 'compressed': len(src)}
+            for decoder in LZ4_CODECS.values():
+                assert decoder.decompress(compressed, len(src)) == src
+            stats = {}
+            encoder.compress(src, skipRatio=None, stats=stats)
+            assert stats == {'compressed': len(src)}
+    for length in (0, 1, 14, 15, 16, 270, 300):
+        src = bytes(range(256)) * 2
+        block = lz4LiteralBlock(src[:length])
+        assert referenceDecompressChunk(bytes(block)) == src[:length]
+
+
+def testNumpyMatcher():
+    # The NumPy and scalar match finders both write valid blocks, also for
+    # matches and literal runs that cross the search segments
+    numpy = compression_utils.np
+    if numpy == None:
+        return
+    random.seed(2)
+    side = 100
+    points = struct.pack('<%df' % (3 * 40000), *[v for i in range(40000) for v in ((i % side) * 0.01, 0.0, (i // side) * 0.01)])
+    wave = struct.pack('<%df' % 30000, *[math.sin(i * 0.01) for i in range(30000)])
+    noise = bytes(random.getrandbits(8) for i in range(LZ4_NUMPY_SEGMENT + 3000))
+    buffers = [points, wave, noise + noise[:70000], bytes(LZ4_NUMPY_SEGMENT * 2 + 7), b'ab' * 700, bytes(LZ4_NUMPY_MIN_SIZE)]
+    for src in buffers:
+        sizes = []
+        for useNumpy in (True, False):
+            compression_utils.np = numpy if useNumpy else None
+            try:
+                block = lz4CompressDefault(src)
+            finally:
+                compression_utils.np = numpy
+            assert referenceDecompressChunk(bytes(block)) == src
+            sizes.append(len(block))
+        assert sizes[0] <= sizes[1] * 1.1
+
+
+def testAcceleration():
+    # Higher acceleration skips ahead faster and trades ratio for speed,
+    # tuned settings give the same blocks with or without NumPy
+    numpy = compression_utils.np
+    random.seed(3)
+    src = bytes(random.choice(b'abcd') for i in range(20000))
+    blocks = []
+    for acceleration, hashLog in ((1, LZ4_HASH_LOG), (2, LZ4_HASH_LOG), (16, LZ4_HASH_LOG), (64, LZ4_HASH_LOG), (1, 8)):
+        compression_utils.np = None
+        try:
+            block = lz4CompressDefault(src, acceleration, hashLog)
+        finally:
+            compression_utils.np = numpy
+        assert referenceDecompressChunk(bytes(block)) == src
+        if acceleration != 1 or hashLog != LZ4_HASH_LOG:
+            assert lz4CompressDefault(src, acceleration, hashLog) == block
+        blocks.append(block)
+    sizes = [len(block) for block in blocks[:4]]
+    assert sizes == sorted(sizes) and sizes[0] < sizes[-1]
+    assert len(set(bytes(block) for block in blocks)) == len(blocks)
+
+
+for buffer in makeBuffers():
+    for level in (0, LZ4HC_MIN_LEVEL, 9, LZ4HC_MAX_LEVEL):
+        testDecompress(buffer, level)
+    for acceleration in (2, 8, 64):
+        testDecompress(buffer, 0, acceleration)
+    for level in (0, LZ4HC_MIN_LEVEL, LZ4HC_MAX_LEVEL):
+        testCodecInterop(buffer, level)
+testOverlappingMatches()
+testCorruptOffsets()
+testNumpyMatcher()
+testAcceleration()
+testSkip()
+chunkBuffer = bytes(random.choice(b'abcdefgh') for i in range(20000))
+testChunks(chunkBuffer)
+testChunks(chunkBuffer, workers = 2)
+testManyChunks()
+print('LZ4 Backends:', ', '.join(LZ4_CODECS.keys()))
+print('LZ4 Round Trip Tests Passed')
@@ -0,0 +1,216 @@
+import bpy
+import io
+import os
+import sys
+import struct
+import random
+import tempfile
+import importlib
+
+scriptPath = bpy.path.abspath("//") + '//..'
+if not scriptPath in sys.path:
+    sys.path.append(scriptPath)
+
+import io_scene_usdz
+
+importlib.reload(io_scene_usdz)
+
+import io_scene_usdz.crate_file
+
+importlib.reload(io_scene_usdz.crate_file)
+
+
+import io_scene_usdz.crate_file as crate_file
+from io_scene_usdz.crate_file import *
+from io_scene_usdz.value_types import *
+
+
+def buildData():
+    random.seed(0)
+    data = UsdData()
+    data['upAxis'] = 'Y'
+    data['customLayerData'] = {'creator': 'test', 'version': '1'}
+    root = data.createChild('Root', ClassType.Xform)
+    mesh = root.createChild('Mesh', ClassType.Mesh)
+    mesh['points'] = [(random.random(), random.random(), float(i)) for i in range(500)]
+    mesh['normals'] = [(0.0, 1.0, float(i % 3)) for i in range(500)]
+    mesh['faceVertexIndices'] = [random.randint(-1000, 1000) for i in range(500)]
+    mesh['widths'] = [random.random() for i in range(30)]
+    mesh['xformOpOrder'] = ['xformOp:transform']
+    mesh['xformOpOrder'].valueType = ValueType.token
+    mesh['xformOp:transform'] = ((1.0, 0.0, 0.0, 0.0), (0.0, 1.0, 0.0, 0.0), (0.0, 0.0, 1.0, 0.0), (2.0, 3.0, 4.0, 1.0))
+    skel = root.createChild('Skel', ClassType.Skeleton)
+    skel['restTransforms'] = [((1.0, 0.0, 0.0, 0.0), (0.0, 1.0, 0.0, 0.0), (0.0, 0.0, 1.0, 0.0), (float(i), 0.0, 0.0, 1.0)) for i in range(5)]
+    skel['restTransforms'].valueType = ValueType.matrix4d
+    att = skel.createAttribute('rotations', type=ValueType.quatf)
+    for frame in range(5):
+        att.addTimeSample(frame, [(1.0, 0.0, float(frame), 0.0)] * 3)
+    return data
+
+
+file = io.BytesIO()
+CrateFile(file).writeUsd(buildData())
+crate = file.getvalue()
+expected = CrateFile(io.BytesIO(crate)).readUsd().toString()
+
+# Byte buffers and crates at an offset in a larger buffer
+assert CrateFile(crate).readUsd().toString() == expected
+padded = bytes(100) + crate + bytes(30)
+buffer = mapCrateFile(padded, 100, len(crate))
+assert CrateFile(buffer).readUsd().toString() == expected
+buffer.close()
+
+# Files on disk are memory mapped, also at an offset
+with tempfile.TemporaryFile() as file:
+    file.write(padded)
+    file.flush()
+    buffer = mapCrateFile(file, 100, len(crate))
+    assert buffer.mapping != None
+    assert CrateFile(buffer).readUsd().toString() == expected
+    buffer.close()
+    file.seek(0)
+    file.truncate()
+    file.write(crate)
+    file.flush()
+    reader = CrateFile(file)
+    assert reader.readUsd(lazy = False).toString() == expected
+    # The mapping is released once the file is read
+    assert reader.file is file
+    # Lazy reads keep the mapping until the crate is closed
+    reader = CrateFile(file)
+    data = reader.readUsd()
+    mapping = reader.file.mapping
+    assert not mapping.closed
+    reader.close()
+    assert mapping.closed
+
+# Arrays and time samples are decoded on first access
+data = CrateFile(crate).readUsd()
+mesh, skel = data.children[0].children
+assert all(att.isLazy() for att in (mesh['points'], mesh['normals'], skel['rotations']))
+assert not mesh['xformOp:transform'].isLazy()
+assert len(mesh['points'].value) == 500
+assert not mesh['points'].isLazy() and mesh['normals'].isLazy()
+assert data.toString() == expected
+data = CrateFile(crate).readUsd(memoize = False)
+points = data.children[0].children[0]['points']
+assert points.value is not points.value and points.isLazy()
+
+# Arrays are typed arrays, or lists of tuples with the compatibility flag
+def readMesh(tuples, useNumpy):
+    numpy = crate_file.np
+    if not useNumpy:
+        crate_file.np = None
+    try:
+        data = CrateFile(crate).readUsd(lazy = False, tuples = tuples)
+        mesh, skel = data.children[0].children
+        return mesh, skel
+    finally:
+        crate_file.np = numpy
+
+mesh, skel = readMesh(True, False)
+points = mesh['points'].value
+assert type(points) is list and type(points[0]) is tuple
+assert type(skel['restTransforms'].value[0][0]) is tuple
+for useNumpy in (False, True):
+    if useNumpy and crate_file.np == None:
+        continue
+    typed, typedSkel = readMesh(False, useNumpy)
+    assert [tuple(p) for p in typed['points'].value] == points
+    assert list(typed['widths'].value) == mesh['widths'].value
+    assert list(typed['faceVertexIndices'].value) == mesh['faceVertexIndices'].value
+    assert valueToString(typedSkel['restTransforms'].value) == valueToString(skel['restTransforms'].value)
+    if useNumpy:
+        assert typed['points'].value.shape == (500, 3)
+        assert typedSkel['restTransforms'].value.shape == (5, 4, 4)
+    else:
+        assert typed['widths'].value.typecode == 'f'
+
+# Half precision values decode through float16
+halfs = [0.5, -2.0, 1.5, 0.25, 3.0, 65504.0]
+data = bytearray(len(halfs).to_bytes(8, 'little') + struct.pack('<%de' % len(halfs), *halfs))
+reader = CrateFile(mapCrateFile(data))
+reader.version = 7
+for vType, shape in ((ValueType.half, ()), (ValueType.vec3h, (3,)), (ValueType.vec2h, (2,))):
+    count = len(halfs) // (shape[0] if shape else 1)
+    data[:8] = count.to_bytes(8, 'little')
+    rep = ARRAY_BIT | (vType.value << 48)
+    for tuples in (True, False):
+        reader.tuples = tuples
+        value = reader.getRepValue(rep)
+        if shape:
+            assert [tuple(v) for v in value] == [tuple(halfs[i:i + shape[0]]) for i in range(0, len(halfs), shape[0])]
+        else:
+            assert list(value) == halfs
+# Compressed half arrays, as whole numbers and as a lookup table
+wholes = [float(i % 9 - 4) for i in range(40)]
+table = [0.5, -2.0, 1.5]
+indices = [i % 3 for i in range(40)]
+writer = CrateFile(io.BytesIO())
+writeInt(writer.file, len(wholes), 8)
+writer.file.write(b'i')
+writer.writeInt32Compressed([int(v) for v in wholes])
+tableStart = writer.file.tell()
+writeInt(writer.file, len(indices), 8)
+writer.file.write(b't')
+writeInt(writer.file, len(table), 4)
+writer.file.write(struct.pack('<%de' % len(table), *table))
+writer.writeInt32Compressed(indices)
+reader = CrateFile(mapCrateFile(writer.file.getvalue()))
+reader.version = 7
+rep = ARRAY_BIT | COMPRESSED_BIT | (ValueType.half.value << 48)
+for tuples in (True, False):
+    reader.tuples = tuples
+    assert list(reader.getRepValue(rep)) == wholes
+    assert list(reader.getRepValue(rep | tableStart)) == [table[i] for i in indices]
+
+reader = CrateFile(mapCrateFile(data))
+reader.version = 7
+reader.tuples = False
+assert reader.getRepValue((ValueType.quath.value << 48) | 8) == tuple(halfs[:4])
+assert reader.getRepValue(INLINE_BIT | (ValueType.half.value << 48) | 0x3C00) == 1.0
+
+# Arrays below the minimum compressed size are plain even when flagged
+for vType, packType in ((ValueType.int, 'i'), (ValueType.float, 'f'), (ValueType.double, 'd')):
+    for count in (1, 5, MIN_COMPRESSED_ARRAY_SIZE - 1):
+        values = [i * 3 - 4 for i in range(count)]
+        data = count.to_bytes(8, 'little') + struct.pack('<%d%s' % (count, packType), *values)
+        reader = CrateFile(mapCrateFile(data))
+        reader.version = 7
+        rep = ARRAY_BIT | COMPRESSED_BIT | (vType.value << 48)
+        for tuples in (True, False):
+            reader.tuples = tuples
+            assert list(reader.getRepValue(rep)) == values
+
+# Half vector attributes read back through readUsd by their type names
+halfTypes = [('half2', ValueType.vec2h, 2), ('texCoord2h', ValueType.vec2h, 2),
+             ('half3', ValueType.vec3h, 3), ('color3h', ValueType.vec3h, 3),
+             ('normal3h', ValueType.vec3h, 3), ('point3h', ValueType.vec3h, 3),
+             ('texCoord3h', ValueType.vec3h, 3), ('half4', ValueType.vec4h, 4),
+             ('color4h', ValueType.vec4h, 4)]
+data = UsdData()
+prim = data.createChild('Root', ClassType.Mesh)
+for typeStr, vType, size in halfTypes:
+    values = [tuple(halfs[(i + j) % len(halfs)] for j in range(size)) for i in range(20)]
+    att = prim.createAttribute(typeStr + 'Values', values, vType)
+    if vType.toString() != typeStr:
+        att.valueTypeStr = typeStr
+    prim.createAttribute(typeStr + 'Value', values[1], vType)
+prim.createAttribute('orient', type=ValueType.quath)
+file = io.BytesIO()
+CrateFile(file).writeUsd(data)
+for tuples in (True, False):
+    result = CrateFile(file.getvalue()).readUsd(tuples = tuples).children[0]
+    for typeStr, vType, size in halfTypes:
+        values = [tuple(halfs[(i + j) % len(halfs)] for j in range(size)) for i in range(20)]
+        att = result[typeStr + 'Values']
+        assert att.valueType == vType and att.valueTypeToString() == typeStr + '[]'
+        assert [tuple(v) for v in att.value] == values
+        assert tuple(result[typeStr + 'Value'].value) == values[1]
+    assert result['orient'].valueType == ValueType.quath
+assert 'color3h[] color3hValues' in result.toString()
+
+buffer = CrateBuffer(bytes(range(16)), 4, 8)
+assert buffer.readInt(2) == 0x0504 and buffer.unpack('<B') == (6,)
+assert bytes(buffer.read()) == bytes(range(7, 12)) and buffer.tell() == 8
+print('Mapped Reader Tests Passed')
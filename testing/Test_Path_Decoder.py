@@ -0,0 +1,71 @@
+import bpy
+import io
+import os
+import sys
+import importlib
+
+scriptPath = bpy.path.abspath("//") + '//..'
+if not scriptPath in sys.path:
+    sys.path.append(scriptPath)
+
+import io_scene_usdz
+
+importlib.reload(io_scene_usdz)
+
+import io_scene_usdz.crate_file
+
+importlib.reload(io_scene_usdz.crate_file)
+
+
+from io_scene_usdz.crate_file import *
+from io_scene_usdz.value_types import *
+
+
+def writeCrate(data):
+    file = io.BytesIO()
+    CrateFile(file).writeUsd(data)
+    return file.getvalue()
+
+
+# Empty prims next to siblings, attributes and at the end of a subtree
+data = UsdData()
+root = data.createChild('Root', ClassType.Xform)
+looks = root.createChild('Looks', ClassType.Scope)
+material = looks.createChild('Material', ClassType.Material)
+material.createChild('Shader', ClassType.Shader)['inputs:roughness'] = 0.5
+looks.createChild('Empty', ClassType.Material)
+root.createChild('Group', ClassType.Xform)
+root.createChild('Mesh', ClassType.Mesh)['points'] = [(0.0, 1.0, 2.0)]
+root.createChild('Last', ClassType.Xform)
+root['size'] = 2.0
+crate = CrateFile(writeCrate(data))
+assert crate.readUsd().toString() == data.toString()
+assert crate.pathStrings[:4] == ['/', '/Root', '/Root/Looks', '/Root/Looks/Material']
+assert '/Root/Mesh.points' in crate.pathStrings and '/Root.size' in crate.pathStrings
+for index, pathStr in enumerate(crate.pathStrings[1:], 1):
+    parent = crate.pathStrings[crate.pathParents[index]]
+    name = crate.getTokenStr(crate.pathTokens[index])
+    separator = '/' if crate.pathPrims[index] else '.'
+    assert pathStr == parent.rstrip('/') + separator + name
+looks = [crate.pathStrings[i] for i in crate.getPathEntries('/Root/Looks', primsOnly = True)]
+assert looks == ['/Root/Looks', '/Root/Looks/Material', '/Root/Looks/Material/Shader', '/Root/Looks/Empty']
+assert len(crate.getPathEntries('/Root/Looks')) == 5
+
+# Hierarchies deeper than the recursion limit
+depth = sys.getrecursionlimit() * 2
+data = UsdData()
+prim = data.createChild('Root', ClassType.Xform)
+for i in range(depth):
+    prim = prim.createChild('Child', ClassType.Xform)
+prim['size'] = 1.0
+limit = sys.getrecursionlimit()
+sys.setrecursionlimit(depth * 4)
+crate = writeCrate(data)
+sys.setrecursionlimit(limit)
+reader = CrateFile(crate)
+prim = reader.readUsd().children[0]
+for i in range(depth):
+    prim = prim.children[0]
+assert prim['size'].value == 1.0
+assert reader.pathStrings[-1] == '/Root' + '/Child' * depth + '.size'
+print('Path Decoder Tests Passed')
@@ -0,0 +1,115 @@
+import bpy
+import io
+import os
+import sys
+import importlib
+
+scriptPath = bpy.path.abspath("//") + '//..'
+if not scriptPath in sys.path:
+    sys.path.append(scriptPath)
+
+import io_scene_usdz
+
+importlib.reload(io_scene_usdz)
+
+import io_scene_usdz.crate_file
+
+importlib.reload(io_scene_usdz.crate_file)
+
+
+from io_scene_usdz.crate_file import *
+from io_scene_usdz.value_types import *
+
+
+def buildData():
+    data = UsdData()
+    data['upAxis'] = 'Y'
+    root = data.createChild('Root', ClassType.Xform)
+    root.createAttribute('visibility', 'inherited', ValueType.token)
+    looks = root.createChild('Looks', ClassType.Scope)
+    material = looks.createChild('Material', ClassType.Material)
+    shader = material.createChild('Shader', ClassType.Shader)
+    shader['inputs:roughness'] = 0.5
+    shader['outputs:surface'] = ValueType.token
+    material['outputs:surface'] = shader['outputs:surface']
+    body = root.createChild('Body', ClassType.Xform)
+    mesh = body.createChild('Mesh', ClassType.Mesh)
+    mesh['points'] = [(0.0, 1.0, 2.0)] * 3
+    mesh['material:binding'] = material
+    body['size'] = 2.0
+    last = root.createChild('Last', ClassType.Scope)
+    last['count'] = 3
+    return data
+
+
+def writePaths(data):
+    file = io.BytesIO()
+    crate = CrateFile(file)
+    crate.writeUsd(data)
+    for name, start, size in crate.toc:
+        if name == 'PATHS':
+            return crate, file.getvalue()[start:start + size]
+
+
+# PATHS section written by the recursive getPathJump helpers
+expected = bytes.fromhex(
+    '100000000000000010000000000000000b000000000000000090010000000100000000'
+    '190000000000000000f0070400000014555555ff0702df02001a0dcfff0323d516170000'
+    '000000000000f0050000000051155514ff07f904fdfe07fefdfe04fc')
+crate, paths = writePaths(buildData())
+assert paths == expected
+assert [j for p, t, j in crate.paths] == [-1, -1, 6, -1, 3, 0, -2, -2, 5, 3, 0, -2, -2, 2, -2, -2]
+# Prims without children or properties jump to their sibling with 0, or
+# end their parent with -2, the tree and streamed writers agree
+def buildLeaves():
+    data = UsdData()
+    root = data.createChild('Root', ClassType.Xform)
+    looks = root.createChild('Looks', ClassType.Scope)
+    looks.createChild('Empty', ClassType.Scope)
+    looks.createChild('Material', ClassType.Material)['inputs:roughness'] = 0.5
+    body = root.createChild('Body', ClassType.Xform)
+    body.createChild('Leaf', ClassType.Xform)
+    body['size'] = 2.0
+    root.createChild('Last', ClassType.Scope)
+    return data
+
+crate, paths = writePaths(buildLeaves())
+jumps = [(crate.tokens[abs(t)], j) for p, t, j in crate.paths]
+assert jumps == [('', -1), ('Root', -1), ('Looks', 4), ('Empty', 0), ('Material', -1),
+                 ('inputs:roughness', -2), ('Body', 3), ('Leaf', 0), ('size', -2), ('Last', -2)]
+stream = CrateFile(io.BytesIO())
+data = buildLeaves()
+stream.beginUsd(data.metadata)
+for prim in data.children:
+    stream.writePrim(prim)
+stream.finish()
+assert [(stream.tokens[abs(t)], j) for p, t, j in stream.paths] == jumps
+# The reader finds no children under the leaves
+reader = CrateFile(io.BytesIO(stream.file.getvalue()))
+result = reader.readUsd()
+looks, body, last = result.children[0].children
+assert [c.name for c in looks.children] == ['Empty', 'Material']
+assert looks.children[0].children == [] and body.children[0].children == [] and last.children == []
+# Hierarchies deeper than the recursion limit are written by both writers
+def buildChain(depth):
+    data = UsdData()
+    prim = data.createChild('Root', ClassType.Xform)
+    for i in range(depth):
+        prim = prim.createChild('Bone%d' % i, ClassType.Xform)
+        prim['size'] = float(i)
+    return data
+
+depth = sys.getrecursionlimit() + 1000
+crate, paths = writePaths(buildChain(depth))
+stream = CrateFile(io.BytesIO())
+data = buildChain(depth)
+stream.beginUsd(data.metadata)
+for prim in data.children:
+    stream.writePrim(prim)
+stream.finish()
+assert [(stream.tokens[abs(t)], j) for p, t, j in stream.paths] == [(crate.tokens[abs(t)], j) for p, t, j in crate.paths]
+prim = CrateFile(io.BytesIO(stream.file.getvalue())).readUsd().children[0]
+for i in range(depth):
+    prim = prim.children[0]
+assert prim.name == 'Bone%d' % (depth - 1) and prim.children == []
+print('Path Writer Tests Passed')
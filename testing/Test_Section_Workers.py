@@ -0,0 +1,46 @@
+import bpy
+import io
+import os
+import sys
+import importlib
+
+scriptPath = bpy.path.abspath("//") + '//..'
+if not scriptPath in sys.path:
+    sys.path.append(scriptPath)
+
+import io_scene_usdz
+
+importlib.reload(io_scene_usdz)
+
+import io_scene_usdz.crate_file
+
+importlib.reload(io_scene_usdz.crate_file)
+
+
+from io_scene_usdz.crate_file import *
+from io_scene_usdz.value_types import *
+
+
+def buildData():
+    data = UsdData()
+    prim = data.createChild('Root', ClassType.Xform)
+    prim.createAttribute('points', [(0.0, 1.0, float(i)) for i in range(1000)], ValueType.vec3f)
+    for name, step in (('a', 1), ('b', 2), ('c', 1)):
+        att = prim.createAttribute(name, type=ValueType.vec3f)
+        for frame in range(0, 10 * step, step):
+            att.addTimeSample(frame, (1.0, float(frame), 0.0))
+    return data
+
+
+# Sections encoded in a process pool write the same bytes
+data = buildData()
+for level in (0, 9):
+    sequential = CrateFile(io.BytesIO(), level)
+    sequential.writeUsd(data)
+    concurrent = CrateFile(io.BytesIO(), level, sectionWorkers = 3)
+    concurrent.writeUsd(data)
+    assert concurrent.file.getvalue() == sequential.file.getvalue()
+    assert concurrent.toc == sequential.toc
+    assert concurrent.compressionStats == sequential.compressionStats
+    assert list(concurrent.sectionTimes.keys()) == [name for name, tables in CRATE_SECTIONS]
+print('Section Workers Tests Passed')
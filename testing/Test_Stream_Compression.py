@@ -0,0 +1,75 @@
+import bpy
+import io
+import os
+import sys
+import tempfile
+import tracemalloc
+import importlib
+
+scriptPath = bpy.path.abspath("//") + '//..'
+if not scriptPath in sys.path:
+    sys.path.append(scriptPath)
+
+import io_scene_usdz
+
+importlib.reload(io_scene_usdz)
+
+import io_scene_usdz.crate_file
+
+importlib.reload(io_scene_usdz.crate_file)
+
+
+from io_scene_usdz.crate_file import *
+from io_scene_usdz.value_types import *
+
+
+def buildData(numPrims):
+    data = UsdData()
+    data['upAxis'] = 'Y'
+    root = data.createChild('Root', ClassType.Xform)
+    for i in range(numPrims):
+        prim = root.createChild('Prim%d' % i, ClassType.Xform)
+        prim.createAttribute('size', float(i))
+    return data
+
+
+# Small chunks push TOKENS and FIELDS past the chunk count limit
+file = io.BytesIO()
+CrateFile(file, chunkSize = 256).writeUsd(buildData(3000))
+file.seek(0)
+data = CrateFile(file).readUsd()
+root = data.children[0]
+assert len(root.children) == 3000
+assert root.children[-1].name == 'Prim2999'
+assert root.children[-1]['size'].value == 2999.0
+file = io.BytesIO()
+CrateFile(file).writeUsd(buildData(3000))
+file.seek(0)
+assert CrateFile(file).readUsd().toString() == data.toString()
+
+def writeTokens(numTokens):
+    # Returns the peak memory of streaming the TOKENS section to a file
+    with tempfile.TemporaryFile() as file:
+        crate = CrateFile(file)
+        crate.tokens = ['token_%08d' % i for i in range(numTokens)]
+        blobSize = sum(len(token) + 1 for token in crate.tokens)
+        tracemalloc.start()
+        crate.writeTokensSection()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        file.seek(8)
+        inputSize = int.from_bytes(file.read(8), 'little')
+        size = int.from_bytes(file.read(8), 'little')
+        assert inputSize == blobSize
+        tokens = bytes(crate.decompress(file.read(size), inputSize)).split(b'\0')[:-1]
+        assert [token.decode() for token in tokens] == crate.tokens
+    return blobSize, peak
+
+
+# The tokens stream holds about one chunk of input at a time, so the peak
+# barely grows with the size of the token blob
+smallSize, smallPeak = writeTokens(150000)
+largeSize, largePeak = writeTokens(600000)
+assert largeSize - smallSize > 4 * LZ4_STREAM_CHUNK_SIZE
+assert largePeak - smallPeak < (largeSize - smallSize) // 4, (smallPeak, largePeak)
+print('Stream Compression Tests Passed')
@@ -0,0 +1,124 @@
+import bpy
+import io
+import os
+import sys
+import random
+import tempfile
+import importlib
+
+scriptPath = bpy.path.abspath("//") + '//..'
+if not scriptPath in sys.path:
+    sys.path.append(scriptPath)
+
+import io_scene_usdz
+
+importlib.reload(io_scene_usdz)
+
+import io_scene_usdz.crate_file
+
+importlib.reload(io_scene_usdz.crate_file)
+
+
+from io_scene_usdz.crate_file import *
+from io_scene_usdz.value_types import *
+
+
+def buildData(numPrims):
+    random.seed(0)
+    data = UsdData()
+    data['upAxis'] = 'Y'
+    data['metersPerUnit'] = 1.0
+    root = data.createChild('Root', ClassType.Xform)
+    mesh = root.createChild('Mesh', ClassType.Mesh)
+    # Bound to a material that is only written after the mesh
+    looks = root.createChild('Looks', ClassType.Scope)
+    material = looks.createChild('Material', ClassType.Material)
+    mesh['material:binding'] = material
+    mesh['points'] = [(random.random(), 0.0, float(i)) for i in range(300)]
+    mesh['points'].valueTypeStr = 'point3f'
+    prims = [root]
+    for i in range(numPrims):
+        parent = random.choice(prims)
+        prim = parent.createChild('Prim%d' % i, ClassType.Xform)
+        if i % 2 == 0:
+            prim.createAttribute('size', float(i))
+        if i % 3 == 0:
+            att = prim.createAttribute('xformOp:translate', type=ValueType.vec3f)
+            for frame in range(4):
+                att.addTimeSample(frame, (float(frame), 0.0, float(i)))
+        prims.append(prim)
+    return data
+
+
+def readString(file):
+    file.seek(0)
+    return CrateFile(file).readUsd().toString()
+
+
+def streamData(data, file):
+    # Released like the exporter does, once each top level prim is written
+    crate = CrateFile(file)
+    crate.beginUsd(data.metadata)
+    for prim in data.children:
+        crate.writePrim(prim)
+        prim.releaseItems()
+    crate.finish()
+    return crate
+
+
+for numPrims in (0, 1, 50, 500):
+    file = io.BytesIO()
+    tree = CrateFile(file)
+    tree.writeUsd(buildData(numPrims))
+    expected = readString(file)
+    with tempfile.TemporaryFile() as file:
+        stream = streamData(buildData(numPrims), file)
+        assert readString(file) == expected
+    # Same path tree and jumps as the tree writer
+    assert [j for p, t, j in stream.paths] == [j for p, t, j in tree.paths]
+    assert [stream.tokens[abs(t)] for p, t, j in stream.paths] == [tree.tokens[abs(t)] for p, t, j in tree.paths]
+
+# Released prims keep their paths as targets of later prims
+def buildBinding():
+    data = UsdData()
+    looks = data.createChild('Looks', ClassType.Scope)
+    material = looks.createChild('Material', ClassType.Material)
+    material.createChild('Shader', ClassType.Shader)['inputs:roughness'] = 0.5
+    mesh = data.createChild('Mesh', ClassType.Mesh)
+    mesh['material:binding'] = material
+    return data
+
+file = io.BytesIO()
+CrateFile(file).writeUsd(buildBinding())
+expected = readString(file)
+data = buildBinding()
+looks, mesh = data.children
+material = looks.children[0]
+file = io.BytesIO()
+crate = CrateFile(file)
+crate.beginUsd(data.metadata)
+crate.writePrim(looks)
+looks.releaseItems()
+assert looks.children == [] and material.children == [] and material.attributes == []
+crate.writePrim(mesh)
+crate.finish()
+assert readString(file) == expected
+
+# Prims and attributes added one at a time
+data = UsdData()
+file = io.BytesIO()
+crate = CrateFile(file)
+crate.beginUsd({'upAxis': 'Z'})
+crate.beginPrim(UsdPrim('Root', ClassType.Xform))
+crate.beginPrim(UsdPrim('Child', ClassType.Scope))
+crate.addAttribute(UsdAttribute('count', 3))
+crate.endPrim()
+crate.addAttribute(UsdAttribute('size', 2.0))
+crate.endPrim()
+crate.finish()
+root = data.createChild('Root', ClassType.Xform)
+root.createChild('Child', ClassType.Scope).createAttribute('count', 3)
+root.createAttribute('size', 2.0)
+data['upAxis'] = 'Z'
+assert readString(file) == data.toString()
+print('Stream Writer Tests Passed')
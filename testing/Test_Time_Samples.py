@@ -0,0 +1,57 @@
+import bpy
+import io
+import os
+import sys
+import importlib
+
+scriptPath = bpy.path.abspath("//") + '//..'
+if not scriptPath in sys.path:
+    sys.path.append(scriptPath)
+
+import io_scene_usdz
+
+importlib.reload(io_scene_usdz)
+
+import io_scene_usdz.crate_file
+
+importlib.reload(io_scene_usdz.crate_file)
+
+
+from io_scene_usdz.crate_file import *
+from io_scene_usdz.value_types import *
+
+
+# Attributes sampled at different frames keep their own times
+data = UsdData()
+prim = data.createChild('Root', ClassType.Xform)
+for name, step in (('a', 1), ('b', 2), ('c', 1)):
+    att = prim.createAttribute(name, type=ValueType.vec3f)
+    for frame in range(0, 10 * step, step):
+        att.addTimeSample(frame, (1.0, float(frame), 0.0))
+file = io.BytesIO()
+CrateFile(file).writeUsd(data)
+result = CrateFile(io.BytesIO(file.getvalue())).readUsd()
+for att, step in zip(result.children[0].attributes, (1, 2, 1)):
+    assert att.frames == [(float(f), (1.0, float(f), 0.0)) for f in range(0, 10 * step, step)]
+
+# Sample values and frames share the byte budget of the data index
+data = UsdData()
+prim = data.createChild('Root', ClassType.Xform)
+for name in ('a', 'b'):
+    att = prim.createAttribute(name, type=ValueType.vec3f)
+    for frame in range(2000):
+        att.addTimeSample(frame, (float(frame), 0.0, 1.0))
+file = io.BytesIO()
+crate = CrateFile(file)
+crate.writeUsd(data)
+assert crate.dataIndex.hits >= 2001 and crate.dataIndex.evictions == 0
+small = io.BytesIO()
+crate = CrateFile(small, dedupMaxBytes = 16 * 1024)
+crate.writeUsd(data)
+assert crate.dataIndex.evictions > 0 and crate.dataIndex.size <= 16 * 1024
+assert len(small.getvalue()) > len(file.getvalue())
+for output in (file, small):
+    result = CrateFile(io.BytesIO(output.getvalue())).readUsd()
+    for att in result.children[0].attributes:
+        assert att.frames == [(float(f), (float(f), 0.0, 1.0)) for f in range(2000)]
+print('Time Samples Tests Passed')